@@ -1,12 +1,23 @@
 """Fix punctuation and grammar in Icelandic transcriptions using Google Gemini."""
 
+import asyncio
+import functools
+import hashlib
+import json
 import os
+import random
 import sys
+import time
 from google import genai
-from google.genai import types
+from google.genai import errors, types
 from pathlib import Path
 from pydantic import BaseModel, Field
 
+GEMINI_MODEL = "gemini-2.5-flash"
+RPM_LIMIT = 10  # Gemini 2.5 Flash free tier
+PROMPT_VERSION = "v2"  # bump when INSTRUCTIONS change so cached corrections are invalidated
+CACHE_DIR = Path(".cache/gemini_corrections")
+
 GREEN = "\033[32m"
 RED = "\033[31m"
 DIM = "\033[2m"
@@ -19,7 +30,51 @@ class CorrectionResult(BaseModel):
     changes_summary: str = Field(description="Brief summary of changes (in Icelandic)")
 
 
+INSTRUCTIONS = """Þú ert sérfræðingur í íslensku. Textinn kemur beint úr talgreini og er án greinarmerkja og hástafa.
+Settu inn punkta og kommur, hástafi í upphafi setninga og í sérnöfnum, og lagaðu stafsetningu, orðaskil og málfræði (beygingar, föll, samræmi).
+Ekki bæta við eða fella brott setningar og ekki breyta merkingunni. Svaraðu á íslensku.
+
+Dæmi:
+Inntak: halló ég heiti jón og ég bý í reykjavík það var eins og ég var að tala í tunnu
+Úttak: Halló, ég heiti Jón og ég bý í Reykjavík. Það var eins og ég væri að tala í tunnu."""
+
+_SAFETY_SETTINGS = tuple(
+    types.SafetySetting(category=cat, threshold="BLOCK_NONE")
+    for cat in (
+        "HARM_CATEGORY_HATE_SPEECH",
+        "HARM_CATEGORY_HARASSMENT",
+        "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "HARM_CATEGORY_DANGEROUS_CONTENT",
+    )
+)
+
+# INSTRUCTIONS is far below Gemini's 2048-token minimum for explicit caches, but sending it
+# as the system instruction keeps the invariant prefix first so implicit caching can reuse it
+_BASE_CONFIG = types.GenerateContentConfig(
+    system_instruction=INSTRUCTIONS,
+    temperature=0,
+    response_mime_type="application/json",
+    response_schema=CorrectionResult,
+    safety_settings=list(_SAFETY_SETTINGS),
+    # 2.5 Flash thinks by default and bills those tokens against max_output_tokens
+    thinking_config=types.ThinkingConfig(thinking_budget=0),
+)
+_BATCH_CONFIG = _BASE_CONFIG.model_copy(update={"response_schema": list[CorrectionResult]})
+# Structured JSON can't be consumed until it's complete, so streaming asks for plain text
+_STREAM_CONFIG = _BASE_CONFIG.model_copy(update={
+    "system_instruction": f"{INSTRUCTIONS}\n\nSvaraðu einungis með leiðrétta textanum.",
+    "response_mime_type": None,
+    "response_schema": None,
+})
+
+MAX_OUTPUT_TOKENS = 16384
+MIN_CORRECTABLE_CHARS = 12
+MAX_ATTEMPTS = 5
+
+
+@functools.cache
 def load_api_key():
+    """Return the Gemini API key from GEMINI_API_KEY, falling back to .gemini_key. Read once per process."""
     env_key = os.environ.get("GEMINI_API_KEY")
     if env_key:
         return env_key.strip()
@@ -32,58 +87,339 @@ def load_api_key():
     return key_file.read_text().strip()
 
 
-def correct_icelandic(text, verbose=False):
-    """Send text to Gemini to fix punctuation and grammar. Returns corrected text."""
-    client = genai.Client(api_key=load_api_key())
+@functools.lru_cache(maxsize=1)
+def _get_client():
+    """Build the Gemini client once and reuse its connection pool across calls."""
+    return genai.Client(api_key=load_api_key())
+
+
+def _output_budget(text, items=1):
+    """Estimate max_output_tokens from the input: ~3 chars/token, doubled, plus room for the JSON fields."""
+    approx_in_tokens = max(1, len(text) // 3)
+    return min(MAX_OUTPUT_TOKENS, approx_in_tokens * 2 + 128 * items)
+
+
+def _config(base, max_output_tokens):
+    """Copy a base config with the output budget set."""
+    return base.model_copy(update={"max_output_tokens": max_output_tokens})
+
+
+def _needs_correction(text):
+    """False for input where a Gemini round-trip cannot help: VAD leftovers, no letters, or already corrected."""
+    t = text.strip()
+    if len(t) < MIN_CORRECTABLE_CHARS or not any(c.isalpha() for c in t):
+        return False
+    # Raw ASR output has neither capitals nor punctuation; text with both has been corrected before
+    marks = sum(t.count(c) for c in ".!?")
+    return not (t[0].isupper() and t[-1] in ".!?" and marks * 30 >= len(t.split()))
+
+
+def _cache_path(text):
+    normalized = " ".join(text.split())
+    key = hashlib.sha256(f"{PROMPT_VERSION}\n{GEMINI_MODEL}\n{normalized}".encode("utf-8")).hexdigest()
+    return CACHE_DIR / f"{key}.json"
+
+
+def _read_cache(text):
+    """Return a previously corrected text for this input, or None."""
+    try:
+        return json.loads(_cache_path(text).read_text(encoding="utf-8"))["corrected_text"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _write_cache(text, result):
+    """Store a correction atomically. Best-effort: an unwritable cache only costs a warning."""
+    path = _cache_path(text)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(result.model_dump_json(), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"{RED}Cache write failed:{RESET} {e}", file=sys.stderr)
+
+
+def _retryable(e):
+    """Rate limits (429) and server errors (5xx) are transient; anything else won't succeed on retry."""
+    return isinstance(e, errors.ServerError) or (isinstance(e, errors.APIError) and e.code == 429)
+
+
+def _backoff(attempt):
+    return min(60, 2 ** attempt) + random.random()
+
+
+def _generate(client, **kwargs):
+    """client.models.generate_content with exponential backoff on transient errors."""
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return client.models.generate_content(**kwargs)
+        except errors.APIError as e:
+            if not _retryable(e) or attempt == MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(_backoff(attempt))
+
+
+async def _agenerate(client, **kwargs):
+    """Async counterpart of _generate."""
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return await client.aio.models.generate_content(**kwargs)
+        except errors.APIError as e:
+            if not _retryable(e) or attempt == MAX_ATTEMPTS - 1:
+                raise
+            await asyncio.sleep(_backoff(attempt))
+
+
+def _parse(response, validate=False):
+    """Build CorrectionResult(s) from the raw JSON response, or None if it is empty.
+
+    response_schema already constrains Gemini's output to this shape, so full
+    Pydantic validation only runs when asked for (verbose runs).
+    """
+    if not response.text:
+        return None
+    raw = json.loads(response.text)
+    if validate:
+        build = CorrectionResult.model_validate
+    else:
+        build = lambda r: CorrectionResult.model_construct(**r)
+    return [build(r) for r in raw] if isinstance(raw, list) else build(raw)
+
 
-    prompt = f"""You are an Icelandic language expert. You are given raw output from automatic speech recognition (ASR).
+def _has_text(result):
+    # Unvalidated results can lack corrected_text or carry null there
+    return isinstance(getattr(result, "corrected_text", None), str)
 
-The input has NO punctuation and NO capitalization — this is normal for ASR. Your job:
 
-1. SENTENCES: Insert periods (.) where sentences end. Add commas where natural pauses occur.
-2. CAPITALIZATION: Capitalize the first letter of every sentence. Capitalize proper nouns (names, places).
-3. SPELLING: Fix obvious ASR misspellings and wrong word boundaries.
-4. GRAMMAR: Fix all grammatical errors to produce correct, natural Icelandic. ASR frequently gets verb forms, case, and agreement wrong.
-5. PRESERVE: Do NOT add or remove sentences. Do NOT change the meaning. Keep everything in Icelandic.
+def _unpack(result, text, verbose):
+    """Return the corrected text from a parsed CorrectionResult, or the original on an empty response."""
+    if result is None:
+        print(f"{RED}Correction failed:{RESET} empty response from Gemini", file=sys.stderr)
+        return text
+    if not _has_text(result):
+        print(f"{RED}Correction failed:{RESET} no corrected_text in Gemini's response", file=sys.stderr)
+        return text
+
+    if verbose:
+        print(f"{GREEN}Corrected{RESET} {DIM}({result.confidence:.0%} confidence): {result.changes_summary}{RESET}", file=sys.stderr)
 
-Example:
-Input: halló ég heiti jón og ég bý í reykjavík það var eins og ég var að tala í tunnu
-Output: Halló, ég heiti Jón og ég bý í Reykjavík. Það var eins og ég væri að tala í tunnu.
+    _write_cache(text, result)
+    return result.corrected_text
 
-Text to correct:
-{text}"""
+
+def correct_icelandic(text, verbose=False, max_output_tokens=None):
+    """Send text to Gemini to fix punctuation and grammar. Returns corrected text.
+
+    max_output_tokens defaults to a budget sized from the input length.
+    """
+    if not _needs_correction(text):
+        return text
+
+    cached = _read_cache(text)
+    if cached is not None:
+        return cached
+
+    client = _get_client()
+
+    prompt = f"Texti:\n{text}"
 
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
+        response = _generate(
+            client,
+            model=GEMINI_MODEL,
             contents=prompt,
-            config=types.GenerateContentConfig(
-                temperature=0,
-                max_output_tokens=16384,
-                response_mime_type="application/json",
-                response_schema=CorrectionResult,
-                safety_settings=[
-                    types.SafetySetting(category=cat, threshold="BLOCK_NONE")
-                    for cat in [
-                        "HARM_CATEGORY_HATE_SPEECH",
-                        "HARM_CATEGORY_HARASSMENT",
-                        "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                        "HARM_CATEGORY_DANGEROUS_CONTENT",
-                    ]
-                ],
-            ),
+            config=_config(_BASE_CONFIG, max_output_tokens or _output_budget(text)),
         )
+        return _unpack(_parse(response, validate=verbose), text, verbose)
+
+    except Exception as e:
+        print(f"{RED}Correction failed:{RESET} {e}", file=sys.stderr)
+        return text
+
 
-        result = response.parsed
-        if result is None:
-            print(f"{RED}Correction failed:{RESET} empty response from Gemini", file=sys.stderr)
-            return text
+async def acorrect_icelandic(text, verbose=False, max_output_tokens=None):
+    """Async variant of correct_icelandic using the client's aio interface."""
+    if not _needs_correction(text):
+        return text
+
+    cached = _read_cache(text)
+    if cached is not None:
+        return cached
 
-        if verbose:
-            print(f"{GREEN}Corrected{RESET} {DIM}({result.confidence:.0%} confidence): {result.changes_summary}{RESET}", file=sys.stderr)
+    client = _get_client()
 
-        return result.corrected_text
+    prompt = f"Texti:\n{text}"
+
+    try:
+        response = await _agenerate(
+            client,
+            model=GEMINI_MODEL,
+            contents=prompt,
+            config=_config(_BASE_CONFIG, max_output_tokens or _output_budget(text)),
+        )
+        return _unpack(_parse(response, validate=verbose), text, verbose)
 
     except Exception as e:
         print(f"{RED}Correction failed:{RESET} {e}", file=sys.stderr)
         return text
+
+
+def correct_icelandic_stream(text):
+    """Yield the corrected text in pieces as Gemini produces them.
+
+    Use correct_icelandic when you need the confidence score or caching. If Gemini
+    fails before producing anything the original text is yielded instead; a failure
+    after the first piece re-raises, since the output so far is only a prefix.
+    """
+    if not _needs_correction(text):
+        yield text
+        return
+
+    cached = _read_cache(text)
+    if cached is not None:
+        yield cached
+        return
+
+    config = _config(_STREAM_CONFIG, _output_budget(text))
+    produced = False
+    try:
+        for chunk in _get_client().models.generate_content_stream(
+            model=GEMINI_MODEL,
+            contents=f"Texti:\n{text}",
+            config=config,
+        ):
+            if chunk.text:
+                produced = True
+                yield chunk.text
+    except Exception as e:
+        if produced:
+            raise
+        print(f"{RED}Correction failed:{RESET} {e}", file=sys.stderr)
+        yield text
+        return
+
+    if not produced:
+        yield text
+
+
+class _RateLimiter:
+    """Token bucket allowing at most `rpm` request starts per minute."""
+
+    def __init__(self, rpm):
+        self.rate = rpm / 60
+        self.capacity = rpm
+        self.tokens = rpm
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def correct_many(texts, verbose=False, concurrency=15, rpm=RPM_LIMIT):
+    """Correct texts concurrently, at most `concurrency` in flight and `rpm` started per minute.
+
+    Returns the corrected texts in input order.
+    """
+    async def run():
+        sem = asyncio.Semaphore(concurrency)
+        limiter = _RateLimiter(rpm)
+
+        async def one(text):
+            async with sem:
+                await limiter.acquire()
+                return await acorrect_icelandic(text, verbose=verbose)
+
+        return await asyncio.gather(*(one(t) for t in texts))
+
+    return asyncio.run(run())
+
+
+def correct_icelandic_batch(texts, batch_rows=8, verbose=False):
+    """Correct several texts, packing up to batch_rows of them into each Gemini request.
+
+    Returns the corrected texts in input order. Beyond ~8 rows per request the
+    response latency grows faster than the per-row saving, so keep batches small.
+    """
+    corrected = [_read_cache(t) if _needs_correction(t) else t for t in texts]
+    todo = [i for i, c in enumerate(corrected) if c is None]
+
+    for start in range(0, len(todo), batch_rows):
+        rows = todo[start:start + batch_rows]
+        batch = [texts[i] for i in rows]
+        if len(batch) == 1:
+            corrected[rows[0]] = correct_icelandic(batch[0], verbose=verbose)
+            continue
+
+        items = "\n".join(f"<<ITEM {n}>>\n{t}" for n, t in enumerate(batch, 1))
+        prompt = (
+            f"Hér eru {len(batch)} númeraðir textar. Leiðréttu hvern fyrir sig og "
+            f"skilaðu nákvæmlega {len(batch)} niðurstöðum í sömu röð.\n\n{items}"
+        )
+
+        try:
+            response = _generate(
+                _get_client(),
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=_config(_BATCH_CONFIG, _output_budget(items, len(batch))),
+            )
+            results = _parse(response, validate=verbose)
+        except Exception as e:
+            print(f"{RED}Correction failed:{RESET} {e}", file=sys.stderr)
+            for i in rows:
+                corrected[i] = texts[i]
+            continue
+
+        # Gemini occasionally merges or drops items — redo those rows one at a time
+        if not isinstance(results, list) or len(results) != len(batch):
+            for i in rows:
+                corrected[i] = correct_icelandic(texts[i], verbose=verbose)
+            continue
+
+        for i, result in zip(rows, results):
+            # Unvalidated items can lack their text; redo just those rows
+            if _has_text(result):
+                corrected[i] = _unpack(result, texts[i], verbose)
+            else:
+                corrected[i] = correct_icelandic(texts[i], verbose=verbose)
+
+    return corrected
+
+
+def _split_for_correction(segments, target_chars=3000):
+    """Greedily pack whisper segment texts into chunks of about target_chars.
+
+    Chunks only break between segments (VAD pauses), never inside one.
+    """
+    chunks, current, size = [], [], 0
+    for seg in segments:
+        if current and size + len(seg) + 1 > target_chars:
+            chunks.append(" ".join(current))
+            current, size = [], 0
+        current.append(seg)
+        size += len(seg) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def correct_segments(segments, verbose=False, target_chars=3000):
+    """Correct a transcript given as whisper segment texts. Returns the corrected full text.
+
+    Long transcripts are split into ~target_chars chunks and corrected concurrently,
+    keeping each Gemini call fast and well under the output token ceiling.
+    """
+    chunks = _split_for_correction(segments, target_chars)
+    if len(chunks) <= 1:
+        return correct_icelandic(" ".join(chunks), verbose=verbose)
+    return " ".join(correct_many(chunks, verbose=verbose))
@@ -1,5 +1,6 @@
 """Tests for the CLI interface (python transcribe.py ...)."""
 
+import os
 import subprocess
 import sys
 
@@ -37,3 +38,64 @@ def test_unknown_flag_exits_1():
     r = subprocess.run([sys.executable, "transcribe.py", "audio/sample.m4a", "--bogus"], capture_output=True, text=True)
     assert r.returncode == 1
     assert "unknown argument" in r.stderr.lower()
+
+
+def test_missing_dir_exits_1():
+    r = subprocess.run([sys.executable, "transcribe.py", "--dir", "nope/"], capture_output=True, text=True)
+    assert r.returncode == 1
+    assert "not found" in r.stderr.lower()
+
+
+def test_bad_workers_exits_1():
+    r = subprocess.run([sys.executable, "transcribe.py", "--dir", "audio", "--workers", "0"], capture_output=True, text=True)
+    assert r.returncode == 1
+    assert "--workers" in r.stderr
+
+
+def test_batch_reports_errors_per_line():
+    r = subprocess.run([sys.executable, "transcribe.py", "--batch"], input="nope.m4a\n\n", capture_output=True, text=True)
+    assert r.returncode == 0
+    assert r.stdout.startswith("ERR\tnope.m4a\t")
+    assert len(r.stdout.splitlines()) == 1
+
+
+def test_batch_line_keeps_multiline_correction_on_one_line():
+    from transcribe import _batch_line
+
+    line = _batch_line("OK", "a.m4a", "Halló, heimur.\nÞetta er\tprufa.\r\n")
+    assert line == "OK\ta.m4a\tHalló, heimur. Þetta er prufa."
+    assert _batch_line("ERR", "b.m4a", ValueError("bad\nfile")).split("\t") == ["ERR", "b.m4a", "bad file"]
+
+
+def test_clip_threads_needs_a_vad_mode():
+    r = subprocess.run([sys.executable, "transcribe.py", "audio/sample.m4a", "accurate", "--clip-threads", "4"],
+                       capture_output=True, text=True)
+    assert r.returncode == 1
+    assert "--clip-threads" in r.stderr
+
+
+def test_invalid_device_exits_1():
+    r = subprocess.run([sys.executable, "transcribe.py", "audio/sample.m4a", "--device", "tpu"], capture_output=True, text=True)
+    assert r.returncode == 1
+    assert "--device" in r.stderr
+
+
+def test_invalid_compute_type_exits_1():
+    r = subprocess.run([sys.executable, "transcribe.py", "audio/sample.m4a", "--compute-type", "int4"],
+                       capture_output=True, text=True)
+    assert r.returncode == 1
+    assert "--compute-type" in r.stderr
+
+
+def test_glob_without_matches_exits_1():
+    r = subprocess.run([sys.executable, "transcribe.py", "--glob", "nope/*.m4a"], capture_output=True, text=True)
+    assert r.returncode == 1
+    assert "no files match" in r.stderr.lower()
+
+
+def test_whisper_cpp_backend_without_model_exits_1():
+    env = {k: v for k, v in os.environ.items() if k != "WHISPER_CPP_MODEL"}
+    r = subprocess.run([sys.executable, "transcribe.py", "audio/sample.m4a", "--backend", "whisper.cpp"],
+                       capture_output=True, text=True, env=env)
+    assert r.returncode == 1
+    assert "WHISPER_CPP_MODEL" in r.stderr
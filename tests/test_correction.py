@@ -1,9 +1,22 @@
 """Tests for correction.py — Gemini punctuation/grammar fixing."""
 
-from unittest.mock import patch, MagicMock
+import json
+from unittest.mock import patch, MagicMock, AsyncMock
 import pytest
+from google.genai import errors
 
-from correction import load_api_key, correct_icelandic, CorrectionResult
+import correction
+from correction import load_api_key, correct_icelandic, correct_icelandic_batch, correct_icelandic_stream, correct_many, correct_segments, CorrectionResult
+
+
+@pytest.fixture(autouse=True)
+def fresh_client():
+    """The API key and Gemini client are cached per process — reload them for every test."""
+    correction.load_api_key.cache_clear()
+    correction._get_client.cache_clear()
+    yield
+    correction.load_api_key.cache_clear()
+    correction._get_client.cache_clear()
 
 
 # --- API key ---
@@ -28,6 +41,16 @@ def test_env_var_takes_precedence_over_file(tmp_path, monkeypatch):
     assert load_api_key() == "env-key"
 
 
+def test_api_key_read_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    key_file = tmp_path / ".gemini_key"
+    key_file.write_text("first-key\n")
+    assert load_api_key() == "first-key"
+    key_file.write_text("second-key\n")
+    assert load_api_key() == "first-key"
+
+
 def test_load_api_key_missing(tmp_path, monkeypatch):
     monkeypatch.chdir(tmp_path)
     monkeypatch.delenv("GEMINI_API_KEY", raising=False)
@@ -56,11 +79,11 @@ def test_correction_returns_fixed_text(tmp_path, monkeypatch):
     (tmp_path / ".gemini_key").write_text("fake-key")
 
     mock_response = MagicMock()
-    mock_response.parsed = CorrectionResult(
+    mock_response.text = CorrectionResult(
         corrected_text="Halló, heimur.",
         confidence=0.95,
         changes_summary="Bætti við kommu og punkt.",
-    )
+    ).model_dump_json()
     mock_client = MagicMock()
     mock_client.models.generate_content.return_value = mock_response
 
@@ -88,6 +111,372 @@ def test_api_key_reaches_client(tmp_path, monkeypatch):
     mock_cls.return_value.models.generate_content.side_effect = Exception("stop")
 
     with patch("correction.genai.Client", mock_cls):
-        correct_icelandic("test")
+        correct_icelandic("þetta er prufa")
 
     mock_cls.assert_called_once_with(api_key="my-key")
+
+
+def test_client_reused_across_calls(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("my-key")
+
+    mock_cls = MagicMock()
+    mock_cls.return_value.models.generate_content.side_effect = Exception("stop")
+
+    with patch("correction.genai.Client", mock_cls):
+        correct_icelandic("fyrsta prufan")
+        correct_icelandic("önnur prufan")
+
+    assert mock_cls.call_count == 1
+
+
+# --- Batching ---
+
+TEXTS = ["fyrsta setningin", "önnur setningin", "þriðja setningin"]
+
+
+def fix(text):
+    return CorrectionResult(corrected_text=text, confidence=0.9, changes_summary="")
+
+
+def reply(result):
+    """A fake Gemini response carrying the JSON for one result or a list of them."""
+    if isinstance(result, list):
+        return MagicMock(text=json.dumps([r.model_dump() for r in result]))
+    return MagicMock(text=result.model_dump_json())
+
+
+def test_batch_packs_rows_into_one_request(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+
+    mock_client = MagicMock()
+    mock_client.models.generate_content.return_value = reply([fix("Fyrsta setningin."), fix("Önnur setningin."), fix("Þriðja setningin.")])
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        assert correct_icelandic_batch(TEXTS) == ["Fyrsta setningin.", "Önnur setningin.", "Þriðja setningin."]
+
+    assert mock_client.models.generate_content.call_count == 1
+    prompt = mock_client.models.generate_content.call_args[1]["contents"]
+    assert "<<ITEM 1>>\nfyrsta setningin" in prompt and "<<ITEM 3>>\nþriðja setningin" in prompt
+
+
+def test_batch_length_mismatch_retries_row_by_row(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+
+    merged = reply([fix("Fyrsta setningin. Önnur setningin.")])
+    mock_client = MagicMock()
+    mock_client.models.generate_content.side_effect = [
+        merged,
+        reply(fix("Fyrsta setningin.")),
+        reply(fix("Önnur setningin.")),
+    ]
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        assert correct_icelandic_batch(TEXTS[:2]) == ["Fyrsta setningin.", "Önnur setningin."]
+
+    assert mock_client.models.generate_content.call_count == 3
+
+
+def test_batch_item_without_text_redone_alone(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+
+    partial = MagicMock(text=json.dumps([fix("Fyrsta setningin.").model_dump(), {"confidence": 0.9}]))
+    mock_client = MagicMock()
+    mock_client.models.generate_content.side_effect = [partial, reply(fix("Önnur setningin."))]
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        assert correct_icelandic_batch(TEXTS[:2]) == ["Fyrsta setningin.", "Önnur setningin."]
+
+    assert mock_client.models.generate_content.call_count == 2
+    assert mock_client.models.generate_content.call_args[1]["contents"] == "Texti:\nönnur setningin"
+
+
+# --- Async dispatch ---
+
+def test_correct_many_keeps_input_order(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+
+    async def fake_generate(model, contents, config):
+        return reply(fix(contents.rsplit("\n", 1)[-1].capitalize() + "."))
+
+    mock_client = MagicMock()
+    mock_client.aio.models.generate_content = AsyncMock(side_effect=fake_generate)
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        assert correct_many(TEXTS) == ["Fyrsta setningin.", "Önnur setningin.", "Þriðja setningin."]
+
+
+def test_correct_many_failure_returns_original(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+
+    mock_client = MagicMock()
+    mock_client.aio.models.generate_content = AsyncMock(side_effect=Exception("API down"))
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        assert correct_many(TEXTS) == TEXTS
+
+
+# --- Prompt layout ---
+
+def test_instructions_sent_as_system_instruction(tmp_path, monkeypatch):
+    """The invariant instructions go first, in the config, so Gemini can cache them."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+
+    mock_client = MagicMock()
+    mock_client.models.generate_content.return_value = reply(fix("Halló, heimur."))
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        correct_icelandic("halló heimur")
+
+    kwargs = mock_client.models.generate_content.call_args[1]
+    assert kwargs["contents"] == "Texti:\nhalló heimur"
+    assert kwargs["config"].system_instruction == correction.INSTRUCTIONS
+
+
+def test_thinking_disabled_so_budget_covers_the_answer(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+
+    mock_client = MagicMock()
+    mock_client.models.generate_content.side_effect = [
+        reply(fix("Halló, heimur.")),
+        reply([fix("Fyrsta setningin."), fix("Önnur setningin.")]),
+    ]
+    mock_client.models.generate_content_stream.return_value = iter([MagicMock(text="Þriðja setningin.")])
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        correct_icelandic("halló heimur")
+        correct_icelandic_batch(TEXTS[:2])
+        list(correct_icelandic_stream(TEXTS[2]))
+
+    configs = [c[1]["config"] for c in mock_client.models.generate_content.call_args_list]
+    configs.append(mock_client.models.generate_content_stream.call_args[1]["config"])
+    assert [c.thinking_config.thinking_budget for c in configs] == [0, 0, 0]
+    assert all(c.max_output_tokens for c in configs)
+
+
+def test_output_budget_scales_with_input():
+    assert correction._output_budget("halló heimur") < 256
+    assert correction._output_budget("orð " * 100_000) == correction.MAX_OUTPUT_TOKENS
+
+
+# --- Response cache ---
+
+def test_repeat_correction_served_from_disk_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+
+    mock_client = MagicMock()
+    mock_client.models.generate_content.return_value = reply(fix("Halló, heimur."))
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        assert correct_icelandic("halló heimur") == "Halló, heimur."
+        assert correct_icelandic("halló  heimur ") == "Halló, heimur."
+
+    assert mock_client.models.generate_content.call_count == 1
+    assert len(list((tmp_path / ".cache" / "gemini_corrections").glob("*.json"))) == 1
+
+
+def test_failed_correction_not_cached(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+
+    mock_client = MagicMock()
+    mock_client.models.generate_content.side_effect = Exception("API down")
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        correct_icelandic("óbreytt texti")
+
+    assert not (tmp_path / ".cache").exists()
+
+
+def test_unwritable_cache_still_returns_correction(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+    (tmp_path / ".cache").write_text("not a directory")
+
+    mock_client = MagicMock()
+    mock_client.models.generate_content.side_effect = [
+        reply(fix("Halló, heimur.")),
+        reply([fix("Fyrsta setningin."), fix("Önnur setningin.")]),
+    ]
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        assert correct_icelandic("halló heimur") == "Halló, heimur."
+        assert correct_icelandic_batch(TEXTS[:2]) == ["Fyrsta setningin.", "Önnur setningin."]
+
+    assert "Cache write failed" in capsys.readouterr().err
+
+
+# --- Skipping trivial input ---
+
+@pytest.mark.parametrize("text", ["", "   ", "já", "ok takk", "123 456 789 000", "Halló, ég heiti Jón. Ég bý í Reykjavík."])
+def test_trivial_or_corrected_text_skips_gemini(tmp_path, monkeypatch, text):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+
+    mock_cls = MagicMock()
+    with patch("correction.genai.Client", mock_cls):
+        assert correct_icelandic(text) == text
+
+    mock_cls.return_value.models.generate_content.assert_not_called()
+
+
+# --- Streaming ---
+
+def test_stream_yields_chunks(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+
+    mock_client = MagicMock()
+    mock_client.models.generate_content_stream.return_value = iter(
+        [MagicMock(text="Halló, "), MagicMock(text="heimur.")]
+    )
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        assert list(correct_icelandic_stream("halló heimur")) == ["Halló, ", "heimur."]
+
+    config = mock_client.models.generate_content_stream.call_args[1]["config"]
+    assert config.response_schema is None
+
+
+def test_stream_failure_yields_original(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+
+    mock_client = MagicMock()
+    mock_client.models.generate_content_stream.side_effect = Exception("API down")
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        assert "".join(correct_icelandic_stream("óbreytt texti")) == "óbreytt texti"
+
+
+def test_stream_failure_after_first_chunk_raises(tmp_path, monkeypatch):
+    """A partial correction must not pass for a complete one."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+
+    def partial():
+        yield MagicMock(text="Halló, ")
+        raise Exception("connection reset")
+
+    mock_client = MagicMock()
+    mock_client.models.generate_content_stream.return_value = partial()
+
+    pieces = []
+    with patch("correction.genai.Client", return_value=mock_client):
+        with pytest.raises(Exception, match="connection reset"):
+            for piece in correct_icelandic_stream("halló heimur"):
+                pieces.append(piece)
+
+    assert pieces == ["Halló, "]
+
+
+# --- Retries ---
+
+def api_error(cls, code):
+    return cls(code, {"error": {"code": code, "message": "x", "status": "x"}})
+
+
+def test_rate_limit_is_retried(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+    sleep = MagicMock()
+    monkeypatch.setattr("correction.time.sleep", sleep)
+
+    mock_client = MagicMock()
+    mock_client.models.generate_content.side_effect = [
+        api_error(errors.ClientError, 429),
+        api_error(errors.ServerError, 503),
+        reply(fix("Halló, heimur.")),
+    ]
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        assert correct_icelandic("halló heimur") == "Halló, heimur."
+
+    assert sleep.call_count == 2
+
+
+def test_client_error_not_retried(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+    sleep = MagicMock()
+    monkeypatch.setattr("correction.time.sleep", sleep)
+
+    mock_client = MagicMock()
+    mock_client.models.generate_content.side_effect = api_error(errors.ClientError, 400)
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        assert correct_icelandic("óbreytt texti") == "óbreytt texti"
+
+    sleep.assert_not_called()
+    assert mock_client.models.generate_content.call_count == 1
+
+
+# --- Chunking long transcripts ---
+
+def test_split_breaks_only_between_segments():
+    segments = ["a" * 40, "b" * 40, "c" * 40, "d" * 100]
+    chunks = correction._split_for_correction(segments, target_chars=90)
+    assert chunks == ["a" * 40 + " " + "b" * 40, "c" * 40, "d" * 100]
+
+
+def test_correct_segments_joins_chunk_results(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+
+    async def fake_generate(model, contents, config):
+        return reply(fix(contents.rsplit("\n", 1)[-1].capitalize() + "."))
+
+    mock_client = MagicMock()
+    mock_client.aio.models.generate_content = AsyncMock(side_effect=fake_generate)
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        result = correct_segments(TEXTS, target_chars=20)
+
+    assert result == "Fyrsta setningin. Önnur setningin. Þriðja setningin."
+
+
+def test_empty_response_returns_original(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+
+    mock_client = MagicMock()
+    mock_client.models.generate_content.return_value = MagicMock(text=None)
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        assert correct_icelandic("óbreytt texti") == "óbreytt texti"
+
+
+def test_null_corrected_text_returns_original(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+
+    null = '{"corrected_text": null, "confidence": 0.9, "changes_summary": ""}'
+    mock_client = MagicMock()
+    mock_client.models.generate_content.return_value = MagicMock(text=null)
+    mock_client.aio.models.generate_content = AsyncMock(return_value=MagicMock(text=null))
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        assert correct_icelandic("óbreytt texti") == "óbreytt texti"
+        assert correct_many(["óbreytt texti"]) == ["óbreytt texti"]
+
+    assert not (tmp_path / ".cache").exists()
+
+
+def test_verbose_validates_response(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".gemini_key").write_text("fake-key")
+
+    bad = '{"corrected_text": "Halló.", "confidence": 7, "changes_summary": ""}'
+    mock_client = MagicMock()
+    mock_client.models.generate_content.return_value = MagicMock(text=bad)
+
+    with patch("correction.genai.Client", return_value=mock_client):
+        assert correct_icelandic("halló heimur", verbose=True) == "halló heimur"
@@ -1,9 +1,27 @@
 """Tests for transcribe.py — the core transcription logic."""
 
+import gzip
 import json
+import multiprocessing
+import os
+from contextlib import contextmanager
 from unittest.mock import patch, MagicMock
 
-from transcribe import transcribe, save_result, MODEL, MODES
+import numpy as np
+import pytest
+
+import transcribe as transcribe_module
+from transcribe import transcribe, transcribe_stream, transcribe_batch, save_result, stream_segments, flush, MODEL, MODES
+
+
+@pytest.fixture(autouse=True)
+def fresh_model_cache():
+    """Loaded models are cached per process — don't let a mock leak between tests."""
+    transcribe_module._get_model.cache_clear()
+    transcribe_module._decode.cache_clear()
+    yield
+    transcribe_module._get_model.cache_clear()
+    transcribe_module._decode.cache_clear()
 
 
 def make_segment(start, end, text):
@@ -22,12 +40,17 @@ def make_info(duration=10.0, language="is", language_probability=0.99):
     return info
 
 
+@contextmanager
 def mock_whisper(segments, info):
-    mock_cls = MagicMock()
-    mock_instance = MagicMock()
-    mock_instance.transcribe.return_value = (iter(segments), info)
-    mock_cls.return_value = mock_instance
-    return patch("transcribe.WhisperModel", mock_cls)
+    """Patch audio loading, the plain model and the batched pipeline; yields the shared fake engine."""
+    engine = MagicMock()
+    engine.transcribe.return_value = (iter(segments), info)
+    with patch("transcribe.WhisperModel", return_value=engine), \
+         patch("transcribe.BatchedInferencePipeline", return_value=engine), \
+         patch("transcribe._load_audio", return_value=np.zeros(16000, dtype=np.float32)), \
+         patch("transcribe.get_speech_timestamps", return_value=[{"start": 0, "end": 16000}]), \
+         patch("transcribe._warm_model_cache"):
+        yield engine
 
 
 # --- Model ---
@@ -37,6 +60,80 @@ def test_model_points_to_icelandic():
     assert "ct2" in MODEL
 
 
+def test_model_loaded_once_across_calls():
+    with mock_whisper([], make_info()):
+        transcribe("a.m4a", verbose=False)
+        transcribe("b.m4a", verbose=False)
+        assert transcribe_module.WhisperModel.call_count == 1
+
+
+def test_compute_type_follows_device():
+    with mock_whisper([], make_info()):
+        transcribe("fake.m4a", verbose=False, device="cpu")
+        transcribe("fake.m4a", verbose=False, device="cuda")
+        calls = transcribe_module.WhisperModel.call_args_list
+
+    assert calls[0][1]["compute_type"] == "int8"
+    assert calls[1][1]["device"] == "cuda"
+    assert calls[1][1]["compute_type"] == "int8_float16"
+
+
+@pytest.mark.skipif(not hasattr(transcribe_module.os, "posix_fadvise"), reason="posix_fadvise is Linux-only")
+def test_model_weights_prefetched(monkeypatch, tmp_path):
+    (tmp_path / "model.bin").write_bytes(b"weights")
+    (tmp_path / "config.json").write_text("{}")
+    fadvise = MagicMock()
+    monkeypatch.setattr("transcribe.snapshot_download", MagicMock(return_value=str(tmp_path)))
+    monkeypatch.setattr("transcribe.os.posix_fadvise", fadvise)
+
+    transcribe_module._warm_model_cache(MODEL)
+
+    assert fadvise.call_count == 1
+    assert fadvise.call_args[0][3] == transcribe_module.os.POSIX_FADV_WILLNEED
+
+
+def test_num_workers_split_cpu_threads():
+    with mock_whisper([], make_info()):
+        transcribe("fake.m4a", verbose=False, cpu_threads=8, num_workers=4)
+        kwargs = transcribe_module.WhisperModel.call_args[1]
+
+    assert kwargs["num_workers"] == 4
+    assert kwargs["cpu_threads"] == 2
+
+
+def test_model_cache_dir_passed_to_model():
+    with mock_whisper([], make_info()):
+        transcribe("fake.m4a", verbose=False, download_root="/dev/shm/whisper")
+        assert transcribe_module.WhisperModel.call_args[1]["download_root"] == "/dev/shm/whisper"
+
+
+def test_explicit_compute_type_overrides_default():
+    with mock_whisper([], make_info()):
+        transcribe("fake.m4a", verbose=False, device="cuda", compute_type="float16")
+        assert transcribe_module.WhisperModel.call_args[1]["compute_type"] == "float16"
+
+
+def test_auto_device(monkeypatch):
+    monkeypatch.delenv("WHISPER_DEVICE", raising=False)
+    monkeypatch.setattr("transcribe.ctranslate2.get_cuda_device_count", lambda: 1)
+    assert transcribe_module._resolve_device("auto") == "cuda"
+    monkeypatch.setattr("transcribe.ctranslate2.get_cuda_device_count", lambda: 0)
+    assert transcribe_module._resolve_device("auto") == "cpu"
+    monkeypatch.setenv("WHISPER_DEVICE", "cuda")
+    assert transcribe_module._resolve_device("auto") == "cuda"
+    assert transcribe_module._resolve_device("cpu") == "cpu"
+
+
+def test_physical_cores_from_cpuinfo(tmp_path):
+    """Two cores with two hyperthreads each: one id per core."""
+    cpuinfo = tmp_path / "cpuinfo"
+    cpuinfo.write_text("\n\n".join(
+        f"processor\t: {cpu}\nphysical id\t: 0\ncore id\t\t: {core}" for cpu, core in ((0, 0), (1, 1), (2, 0), (3, 1))
+    ))
+    assert transcribe_module._physical_cpu_ids(cpuinfo) == [0, 1]
+    assert transcribe_module._physical_cpu_ids(tmp_path / "missing") == []
+
+
 # --- Modes ---
 
 def test_three_modes_exist():
@@ -47,6 +144,19 @@ def test_beam_sizes_increase_with_quality():
     assert MODES["fast"]["beam_size"] < MODES["balanced"]["beam_size"] < MODES["accurate"]["beam_size"]
 
 
+def test_modes_are_read_only():
+    with pytest.raises(TypeError):
+        MODES["fast"]["beam_size"] = 3
+    with pytest.raises(TypeError):
+        MODES["turbo"] = {}
+
+
+def test_only_accurate_conditions_on_previous_text():
+    assert {name: mode["condition_on_previous_text"] for name, mode in MODES.items()} == {
+        "fast": False, "balanced": False, "accurate": True,
+    }
+
+
 def test_accurate_disables_vad():
     assert MODES["accurate"]["vad_filter"] is False
     assert MODES["fast"]["vad_filter"] is True
@@ -60,7 +170,7 @@ def test_result_structure():
         make_segment(3.5, 7.0, "þetta er prufa"),
     ]
     with mock_whisper(segments, make_info(duration=7.0)):
-        result = transcribe("fake.m4a", verbose=False)
+        result = transcribe("fake.m4a", vad_filter=False, verbose=False)
 
     assert result["full_text"] == "Halló heimur þetta er prufa"
     assert len(result["segments"]) == 2
@@ -86,6 +196,18 @@ def test_filters_short_hallucinated_segments():
     assert [s["text"] for s in result["segments"]] == ["Þetta er rétt", "halló", "já"]
 
 
+# --- Verbose log ---
+
+def test_verbose_logs_each_kept_segment(capsys):
+    segments = [make_segment(0.0, 2.0, "Halló"), make_segment(2.0, 4.0, "heimur")]
+    with mock_whisper(segments, make_info()):
+        transcribe("fake.m4a", verbose=True)
+
+    err = capsys.readouterr().err
+    assert "0.00s -> 2.00s" in err and "Halló" in err
+    assert "2.00s -> 4.00s" in err and "heimur" in err
+
+
 # --- Empty audio ---
 
 def test_empty_audio():
@@ -113,46 +235,408 @@ def test_save_result_creates_files(monkeypatch, tmp_path):
     monkeypatch.chdir(tmp_path)
     result = {"full_text": "Halló", "segments": [], "metadata": {}}
     save_result(result, "test.m4a")
+    flush()
 
     assert (tmp_path / "transcripts" / "test_transcript.txt").read_text() == "Halló"
-    assert json.loads((tmp_path / "transcripts" / "test_transcript.json").read_text())["full_text"] == "Halló"
+    assert json.loads(gzip.decompress((tmp_path / "transcripts" / "test_transcript.json.gz").read_bytes()))["full_text"] == "Halló"
+
+
+def test_save_result_writes_segments_jsonl(monkeypatch, tmp_path):
+    """--dir, --glob and --batch don't stream, so save_result writes the per-segment file itself."""
+    monkeypatch.chdir(tmp_path)
+    segments = [{"start": 0.0, "end": 1.0, "text": "Halló"}, {"start": 1.0, "end": 2.0, "text": "heimur"}]
+    save_result({"full_text": "Halló heimur", "segments": segments, "metadata": {}}, "test.m4a")
+    flush()
+
+    lines = (tmp_path / "transcripts" / "test_segments.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line) for line in lines] == segments
+
+
+def test_save_result_pretty_writes_plain_json(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    result = {"full_text": "Halló", "segments": [], "metadata": {}}
+    save_result(result, "test.m4a", pretty=True)
+    flush()
+
+    text = (tmp_path / "transcripts" / "test_transcript.json").read_text()
+    assert json.loads(text)["full_text"] == "Halló"
+    assert "\n  " in text
+    assert not (tmp_path / "transcripts" / "test_transcript.json.gz").exists()
+
+
+def test_save_result_without_orjson(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("transcribe.orjson", None)
+    result = {"full_text": "Þetta er prufa", "segments": [{"start": 0.0, "end": 1.0, "text": "Þetta er prufa"}],
+              "metadata": {}}
+    save_result(result, "test.m4a")
+    save_result(result, "test.m4a", pretty=True)
+    flush()
+
+    assert json.loads(gzip.decompress((tmp_path / "transcripts" / "test_transcript.json.gz").read_bytes())) == result
+    assert "Þetta" in (tmp_path / "transcripts" / "test_transcript.json").read_text(encoding="utf-8")
 
 
 def test_save_result_with_correction(monkeypatch, tmp_path):
     monkeypatch.chdir(tmp_path)
     result = {"full_text": "halló", "segments": [], "metadata": {}}
     save_result(result, "test.m4a", corrected_text="Halló.")
+    flush()
 
     assert (tmp_path / "transcripts" / "test_corrected.txt").read_text() == "Halló."
 
 
+def test_flush_surfaces_write_errors(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "transcripts" / "test_transcript.txt").mkdir(parents=True)
+
+    save_result({"full_text": "Halló", "segments": [], "metadata": {}}, "test.m4a")
+    with pytest.raises(OSError, match="test_transcript.txt"):
+        flush()
+
+
+def test_failed_write_not_blamed_on_next_file(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "transcripts" / "a_transcript.txt").mkdir(parents=True)
+    result = {"full_text": "Halló", "segments": [], "metadata": {}}
+
+    save_result(result, "a.m4a")
+    transcribe_module._pending[-1][1].exception()  # let a's writes finish first
+    save_result(result, "b.m4a")
+    with pytest.raises(OSError) as error:
+        flush()
+
+    assert "a_transcript.txt" in str(error.value) and "b_" not in str(error.value)
+    assert (tmp_path / "transcripts" / "b_transcript.txt").read_text() == "Halló"
+
+
+# --- Result cache ---
+
+def test_cached_rerun_skips_model(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.m4a").write_bytes(b"audio bytes")
+
+    with mock_whisper([make_segment(0.0, 3.0, "Halló heimur")], make_info()) as engine:
+        first = transcribe("a.m4a", verbose=False, cache=True)
+        second = transcribe("a.m4a", verbose=False, cache=True)
+
+    assert engine.transcribe.call_count == 1
+    assert second["segments"] == first["segments"]
+    assert second["full_text"] == "Halló heimur"
+
+
+def test_unwritable_cache_still_returns_transcript(monkeypatch, tmp_path, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.m4a").write_bytes(b"audio bytes")
+    (tmp_path / ".cache").write_text("not a directory")
+
+    with mock_whisper([make_segment(0.0, 3.0, "Halló heimur")], make_info()):
+        result = transcribe("a.m4a", verbose=False, cache=True)
+
+    assert result["full_text"] == "Halló heimur"
+    assert "Cache write failed" in capsys.readouterr().err
+
+
+def test_cache_keyed_by_settings(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.m4a").write_bytes(b"audio bytes")
+
+    with mock_whisper([], make_info()) as engine:
+        transcribe("a.m4a", beam_size=1, verbose=False, cache=True)
+        transcribe("a.m4a", beam_size=5, verbose=False, cache=True)
+
+    assert engine.transcribe.call_count == 2
+
+
+# --- whisper.cpp backend ---
+
+def test_whisper_cpp_segments_adapted(monkeypatch):
+    cpp_segments = [MagicMock(t0=0, t1=250, text=" Halló heimur"), MagicMock(t0=300, t1=320, text="á")]
+    cpp_model = MagicMock()
+    cpp_model.transcribe.return_value = cpp_segments
+    monkeypatch.setenv("WHISPER_CPP_MODEL", "/models/is.bin")
+    monkeypatch.setattr("transcribe._backend", lambda requested=None: "whisper.cpp")
+    monkeypatch.setattr("transcribe._get_cpp_model", MagicMock(return_value=cpp_model))
+
+    with mock_whisper([], make_info()):
+        result = transcribe("fake.m4a", verbose=False)
+
+    assert result["segments"] == [{"start": 0.0, "end": 2.5, "text": "Halló heimur"}]
+    assert result["metadata"]["audio_duration"] == 1.0
+
+
+def test_whisper_cpp_cache_keyed_by_model_path(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.m4a").write_bytes(b"audio bytes")
+    cpp_model = MagicMock()
+    cpp_model.transcribe.side_effect = lambda *a, **k: [MagicMock(t0=0, t1=250, text="Halló heimur")]
+    monkeypatch.setattr("transcribe._backend", lambda requested=None: "whisper.cpp")
+    monkeypatch.setattr("transcribe._get_cpp_model", MagicMock(return_value=cpp_model))
+
+    with mock_whisper([], make_info()):
+        monkeypatch.setenv("WHISPER_CPP_MODEL", "/models/is-q5.bin")
+        transcribe("a.m4a", verbose=False, cache=True)
+        monkeypatch.setenv("WHISPER_CPP_MODEL", "/models/is-f16.bin")
+        transcribe("a.m4a", verbose=False, cache=True)
+        transcribe("a.m4a", verbose=False, cache=True)
+
+    assert cpp_model.transcribe.call_count == 2
+
+
+def test_whisper_cpp_requested_without_model_fails(monkeypatch):
+    monkeypatch.delenv("WHISPER_CPP_MODEL", raising=False)
+    with pytest.raises(RuntimeError, match="WHISPER_CPP_MODEL"):
+        transcribe_module._backend("whisper.cpp")
+    assert transcribe_module._backend("faster-whisper") == "faster-whisper"
+
+
+# --- Streaming writer ---
+
+def test_stream_segments_writes_as_decoded(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    seen = []
+
+    segments = [make_segment(0.0, 2.0, "Halló"), make_segment(2.0, 4.0, "heimur")]
+    with mock_whisper(segments, make_info()), stream_segments("test.m4a") as write:
+        def on_segment(seg):
+            write(seg)
+            seen.append((tmp_path / "transcripts" / "test_transcript.txt").read_text())
+
+        result = transcribe("test.m4a", verbose=False, on_segment=on_segment)
+
+    assert seen == ["Halló", "Halló heimur"]
+    assert (tmp_path / "transcripts" / "test_transcript.txt").read_text() == result["full_text"]
+    lines = (tmp_path / "transcripts" / "test_segments.jsonl").read_text().splitlines()
+    assert [json.loads(line) for line in lines] == result["segments"]
+
+
+def test_transcribe_stream_yields_then_returns_metadata():
+    segments = [make_segment(0.0, 2.0, "Halló"), make_segment(2.0, 2.1, "á"), make_segment(2.1, 4.0, "heimur")]
+    with mock_whisper(segments, make_info(duration=4.0)):
+        stream = transcribe_stream("fake.m4a", vad_filter=False)
+        first = next(stream)
+        rest = []
+        with pytest.raises(StopIteration) as done:
+            while True:
+                rest.append(next(stream))
+
+    assert first == {"start": 0.0, "end": 2.0, "text": "Halló"}
+    assert [d["text"] for d in rest] == ["heimur"]
+    assert done.value.value["audio_duration"] == 4.0
+
+
 # --- Parameters reach the model ---
 
 def test_beam_size_and_vad_passed_through():
-    mock_cls = MagicMock()
-    mock_inst = MagicMock()
-    mock_inst.transcribe.return_value = (iter([]), make_info())
-    mock_cls.return_value = mock_inst
-
-    with patch("transcribe.WhisperModel", mock_cls):
-        transcribe("fake.m4a", beam_size=10, vad_filter=False, verbose=False)
+    with mock_whisper([], make_info()) as engine:
+        transcribe("fake.m4a", beam_size=10, vad_filter=False, batch_size=1, verbose=False)
 
-    kwargs = mock_inst.transcribe.call_args[1]
+    kwargs = engine.transcribe.call_args[1]
     assert kwargs["beam_size"] == 10
     assert kwargs["vad_filter"] is False
     assert kwargs["vad_parameters"] is None
     assert kwargs["language"] == "is"
     assert kwargs["temperature"] == 0.0
+    assert kwargs["task"] == "transcribe"
+
+
+def test_condition_on_previous_text_off_by_default():
+    with mock_whisper([], make_info()) as engine:
+        transcribe("fake.m4a", vad_filter=False, batch_size=1, verbose=False)
+        transcribe("fake.m4a", **MODES["accurate"], verbose=False)
+
+    assert engine.transcribe.call_args_list[0][1]["condition_on_previous_text"] is False
+    assert engine.transcribe.call_args_list[1][1]["condition_on_previous_text"] is True
 
 
 def test_vad_params_set_when_enabled():
-    mock_cls = MagicMock()
-    mock_inst = MagicMock()
-    mock_inst.transcribe.return_value = (iter([]), make_info())
-    mock_cls.return_value = mock_inst
+    with mock_whisper([], make_info()) as engine:
+        transcribe("fake.m4a", vad_filter=True, batch_size=1, verbose=False)
+
+    kwargs = engine.transcribe.call_args[1]
+    assert kwargs["vad_parameters"] == {"min_silence_duration_ms": 500, "min_speech_duration_ms": 300,
+                                        "max_speech_duration_s": 30, "speech_pad_ms": 300}
+
+
+def test_vad_parameters_from_mode_reach_silero():
+    with mock_whisper([], make_info()):
+        transcribe("fake.m4a", **MODES["fast"], verbose=False)
+        vad_options = transcribe_module.get_speech_timestamps.call_args[0][1]
+
+    assert vad_options.max_speech_duration_s == 30
+    assert vad_options.speech_pad_ms == 300
+
+
+def test_decoded_audio_passed_to_model():
+    with mock_whisper([], make_info()) as engine:
+        transcribe("fake.m4a", verbose=False)
+
+    assert isinstance(engine.transcribe.call_args[0][0], np.ndarray)
+
+
+def test_audio_decoded_once_until_file_changes(tmp_path):
+    audio_file = tmp_path / "a.m4a"
+    audio_file.write_bytes(b"audio bytes")
+
+    with patch("transcribe.decode_audio", return_value=np.zeros(16000, dtype=np.float32)) as decode:
+        transcribe_module._load_audio(audio_file)
+        transcribe_module._load_audio(str(audio_file))
+        assert decode.call_count == 1
+
+        stat = audio_file.stat()
+        os.utime(audio_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        transcribe_module._load_audio(audio_file)
+        assert decode.call_count == 2
+
+
+# --- Batched inference ---
+
+def test_batched_pipeline_used_with_vad():
+    with mock_whisper([], make_info()) as engine:
+        transcribe("fake.m4a", vad_filter=True, batch_size=16, verbose=False)
+
+    assert engine.transcribe.call_args[1]["batch_size"] == 16
+
+
+def test_only_speech_is_decoded_in_30s_windows():
+    """The silence between speech regions is cut out, and timestamps map back to the full audio."""
+    speech = [{"start": 0, "end": 16000 * 10}, {"start": 16000 * 12, "end": 16000 * 25},
+              {"start": 16000 * 28, "end": 16000 * 40}]
+    with mock_whisper([make_segment(24.0, 26.0, "Halló heimur")], make_info()) as engine:
+        transcribe_module._load_audio.return_value = np.zeros(16000 * 60, dtype=np.float32)
+        transcribe_module.get_speech_timestamps.return_value = speech
+        result = transcribe("fake.m4a", vad_filter=True, batch_size=8, verbose=False)
+
+    audio, = engine.transcribe.call_args[0]
+    assert len(audio) == 16000 * 35
+    assert engine.transcribe.call_args[1]["clip_timestamps"] == [{"start": 0.0, "end": 23.0}, {"start": 23.0, "end": 35.0}]
+    assert [(s["start"], s["end"]) for s in result["segments"]] == [(29.0, 31.0)]
+    assert result["metadata"]["audio_duration"] == 60.0
+
+
+def test_sparse_speech_encoded_without_the_silence():
+    """1s of speech every 10s for two minutes is 12s of audio to encode, in a single window."""
+    speech = [{"start": 16000 * t, "end": 16000 * (t + 1)} for t in range(0, 120, 10)]
+    with mock_whisper([], make_info()) as engine:
+        transcribe_module._load_audio.return_value = np.zeros(16000 * 120, dtype=np.float32)
+        transcribe_module.get_speech_timestamps.return_value = speech
+        transcribe("fake.m4a", **MODES["fast"], verbose=False)
+
+    assert len(engine.transcribe.call_args[0][0]) == 16000 * 12
+    assert engine.transcribe.call_args[1]["clip_timestamps"] == [{"start": 0.0, "end": 12.0}]
+
+
+def test_vad_cached_across_modes(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.m4a").write_bytes(b"audio bytes")
+
+    with mock_whisper([], make_info()) as engine:
+        transcribe("a.m4a", **MODES["fast"], verbose=False, cache=True)
+        transcribe("a.m4a", **MODES["balanced"], verbose=False, cache=True)
+        vad_runs = transcribe_module.get_speech_timestamps.call_count
+
+    assert engine.transcribe.call_count == 2
+    assert vad_runs == 1
+    assert engine.transcribe.call_args[1]["clip_timestamps"] == [{"start": 0.0, "end": 1.0}]
+
+
+def test_no_speech_returns_empty_transcript_without_decoding():
+    """An empty clip list would make the batched pipeline rerun VAD with its own defaults."""
+    with mock_whisper([make_segment(0.0, 2.0, "Halló heimur")], make_info()) as engine:
+        transcribe_module.get_speech_timestamps.return_value = []
+        result = transcribe("fake.m4a", **MODES["fast"], verbose=False)
+
+    assert result["full_text"] == ""
+    assert result["metadata"]["audio_duration"] == 1.0
+    assert result["metadata"]["language_probability"] == 1.0
+    engine.transcribe.assert_not_called()
+
+
+def test_clips_decoded_on_threads_without_batching():
+    speech = [{"start": 0, "end": 16000 * 20}, {"start": 16000 * 50, "end": 16000 * 70}]
+    with mock_whisper([], make_info()) as engine:
+        transcribe_module._load_audio.return_value = np.zeros(16000 * 80, dtype=np.float32)
+        transcribe_module.get_speech_timestamps.return_value = speech
+        engine.transcribe.side_effect = lambda *a, **k: (iter([make_segment(1.0, 2.0, "Halló heimur")]), make_info())
+        result = transcribe("fake.m4a", vad_filter=True, batch_size=1, num_workers=2, verbose=False)
+
+    assert [(s["start"], s["end"]) for s in result["segments"]] == [(1.0, 2.0), (51.0, 52.0)]
+    assert all(c[1]["vad_filter"] is False for c in engine.transcribe.call_args_list)
+    assert result["metadata"]["language_probability"] == 1.0
+
+
+def test_sequential_without_vad():
+    """Batching relies on VAD chunks, so accurate mode (no VAD) decodes sequentially."""
+    with mock_whisper([], make_info()) as engine:
+        transcribe("fake.m4a", vad_filter=False, batch_size=16, verbose=False)
+
+    assert "batch_size" not in engine.transcribe.call_args[1]
+
+
+# --- Directory batches ---
+
+def test_batch_capped_by_cpu_threads_keeps_order(monkeypatch):
+    """With too few cores for two workers, files run in-process, one after another."""
+    monkeypatch.setattr("transcribe._worker_threads", lambda: 2)
+    with mock_whisper([], make_info()) as engine:
+        engine.transcribe.side_effect = lambda *a, **k: (iter([make_segment(0.0, 2.0, f"skrá {engine.transcribe.call_count}")]), make_info())
+        results = transcribe_batch(["a.m4a", "b.m4a"], workers=4, verbose=False)
+
+    assert [r["full_text"] for r in results] == ["skrá 1", "skrá 2"]
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="workers inherit the mocks only when forked")
+@pytest.mark.filterwarnings("ignore:This process .* is multi-threaded:DeprecationWarning")
+def test_batch_runs_presets_in_worker_processes(monkeypatch):
+    monkeypatch.setattr("transcribe._worker_threads", lambda: 8)
+    with mock_whisper([make_segment(0.0, 2.0, "Halló heimur")], make_info()) as engine:
+        engine.transcribe.side_effect = lambda *a, **k: (iter([make_segment(0.0, 2.0, "Halló heimur")]), make_info())
+        results = transcribe_batch(["a.m4a", "b.m4a"], workers=2, **MODES["fast"])
+
+    assert [r["full_text"] for r in results] == ["Halló heimur", "Halló heimur"]
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="workers inherit the mocks only when forked")
+@pytest.mark.filterwarnings("ignore:This process .* is multi-threaded:DeprecationWarning")
+def test_gpu_probed_in_workers_not_before_fork(monkeypatch):
+    monkeypatch.setattr("transcribe._worker_threads", lambda: 8)
+    monkeypatch.delenv("WHISPER_DEVICE", raising=False)
+    probe = MagicMock(return_value=0)
+    monkeypatch.setattr("transcribe.ctranslate2.get_cuda_device_count", probe)
+    with mock_whisper([], make_info()) as engine:
+        engine.transcribe.side_effect = lambda *a, **k: (iter([make_segment(0.0, 2.0, "Halló heimur")]), make_info())
+        results = transcribe_batch(["a.m4a", "b.m4a"], workers=2, device="auto", **MODES["fast"])
+
+    assert [r["full_text"] for r in results] == ["Halló heimur", "Halló heimur"]
+    probe.assert_not_called()
+
+
+def fail_on_bad_file(path):
+    if "bad" in path:
+        raise RuntimeError("Invalid data found when processing input")
+    return np.zeros(16000, dtype=np.float32)
+
+
+def test_batch_failure_is_kept_per_file(monkeypatch):
+    monkeypatch.setattr("transcribe._worker_threads", lambda: 2)
+    with mock_whisper([], make_info()) as engine:
+        engine.transcribe.side_effect = lambda *a, **k: (iter([make_segment(0.0, 2.0, "Halló heimur")]), make_info())
+        transcribe_module._load_audio.side_effect = fail_on_bad_file
+        results = transcribe_batch(["a.m4a", "bad.m4a", "c.m4a"], workers=4, verbose=False)
+
+    assert results[0]["full_text"] == results[2]["full_text"] == "Halló heimur"
+    assert isinstance(results[1], RuntimeError)
+
 
-    with patch("transcribe.WhisperModel", mock_cls):
-        transcribe("fake.m4a", vad_filter=True, verbose=False)
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="workers inherit the mocks only when forked")
+@pytest.mark.filterwarnings("ignore:This process .* is multi-threaded:DeprecationWarning")
+def test_worker_failure_is_kept_per_file_and_log_printed(monkeypatch, capsys):
+    monkeypatch.setattr("transcribe._worker_threads", lambda: 8)
+    with mock_whisper([], make_info()) as engine:
+        engine.transcribe.side_effect = lambda *a, **k: (iter([make_segment(0.0, 2.0, "Halló heimur")]), make_info())
+        transcribe_module._load_audio.side_effect = fail_on_bad_file
+        results = transcribe_batch(["a.m4a", "bad.m4a"], workers=2, verbose=True, **MODES["accurate"])
 
-    kwargs = mock_inst.transcribe.call_args[1]
-    assert kwargs["vad_parameters"] == {"min_silence_duration_ms": 500}
+    assert results[0]["full_text"] == "Halló heimur"
+    assert "Invalid data" in str(results[1])
+    assert "Halló heimur" in capsys.readouterr().err
@@ -6,18 +6,121 @@ Usage: python transcribe.py <audio_file> [fast|balanced|accurate] [--llm] [--sav
 
 import sys
 import time
-import json
 import os
+import io
+import atexit
+import functools
+import glob
+import gzip
+import hashlib
+import importlib.util
+import json
+import platform
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, redirect_stderr
 from pathlib import Path
-from faster_whisper import WhisperModel
+from types import MappingProxyType
+from typing import NamedTuple
+
+
+def _physical_cpu_ids(cpuinfo="/proc/cpuinfo"):
+    """One logical CPU id per physical core, read from /proc/cpuinfo. Empty where that file doesn't exist."""
+    try:
+        with open(cpuinfo) as f:
+            blocks = f.read().split("\n\n")
+    except OSError:
+        return []
+    cores = {}
+    for block in blocks:
+        fields = {key.strip(): value.strip() for key, _, value in (line.partition(":") for line in block.splitlines())}
+        if "processor" not in fields:
+            continue
+        # Arm kernels omit "core id"; there every logical CPU is its own core
+        core = (fields.get("physical id"), fields.get("core id", fields["processor"]))
+        cores.setdefault(core, int(fields["processor"]))
+    return sorted(cores.values())
+
+
+@functools.cache
+def _worker_threads():
+    """Physical core count (psutil, else /proc/cpuinfo), falling back to logical CPUs.
+
+    CTranslate2's int8 GEMMs don't gain from hyperthreads, and oversubscribing
+    the OpenMP pool with them costs context switches.
+    """
+    try:
+        import psutil
+    except ImportError:
+        return len(_physical_cpu_ids()) or os.cpu_count()
+    return psutil.cpu_count(logical=False) or os.cpu_count()
+
+
+def _pin_threads():
+    """Restrict this process to one logical CPU per physical core, keeping hyperthread siblings idle (Linux)."""
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    cpus = set(_physical_cpu_ids()) & os.sched_getaffinity(0)
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+
+
+# OpenMP and oneDNN read these once when the native libraries load, so they must be set before
+# faster_whisper is imported. BF16 fast-math and huge pages only apply to oneDNN on Arm Linux.
+os.environ.setdefault("OMP_NUM_THREADS", str(_worker_threads()))
+os.environ.setdefault("MKL_NUM_THREADS", str(_worker_threads()))
+if platform.system() == "Linux" and platform.machine() in ("aarch64", "arm64"):
+    os.environ.setdefault("DNNL_DEFAULT_FPMATH_MODE", "BF16")
+    os.environ.setdefault("THP_MEM_ALLOC_ENABLE", "1")
+
+import ctranslate2
+import numpy as np
+from faster_whisper import BatchedInferencePipeline, WhisperModel
+from faster_whisper.audio import decode_audio
+from faster_whisper.vad import SpeechTimestampsMap, VadOptions, collect_chunks, get_speech_timestamps
+from huggingface_hub import snapshot_download
+from huggingface_hub.utils import LocalEntryNotFoundError
+
+try:
+    import orjson
+except ImportError:  # Optional: the stdlib encoder writes the same JSON, only slower
+    orjson = None
 
 MODEL = "language-and-voice-lab/whisper-large-icelandic-62640-steps-967h-ct2"
+SAMPLE_RATE = 16000
+CACHE_DIR = Path(".cache/transcripts")
+VAD_CACHE_DIR = Path(".cache/vad")
+OUTPUT_DIR = Path("transcripts")
+AUDIO_EXTENSIONS = {".m4a", ".mp3", ".wav", ".flac", ".ogg"}
+COMPUTE_TYPES = ("int8", "int8_float16", "int8_bfloat16", "int8_float32", "float16", "bfloat16", "float32")
+
+# Segments shorter than _MIN_DUR seconds with at most _MIN_LEN characters are hallucinated noise
+_MIN_DUR = 0.3
+_MIN_LEN = 3
 
-MODES = {
-    "fast":     {"beam_size": 1,  "vad_filter": True},
-    "balanced": {"beam_size": 5,  "vad_filter": True},
-    "accurate": {"beam_size": 10, "vad_filter": False},
-}
+# Whisper decodes 30s windows; speech regions are merged up to this length
+_CHUNK_S = 30
+
+# Silero VAD: speech runs of 0.3-30s, split at half-second pauses, padded by 300ms on each side
+_VAD_PARAMETERS = MappingProxyType({
+    "min_silence_duration_ms": 500,
+    "min_speech_duration_ms": 300,
+    "max_speech_duration_s": _CHUNK_S,
+    "speech_pad_ms": 300,
+})
+
+# Fixed for every call: Icelandic transcription, greedy/beam decoding at temperature 0 with no fallback
+# sampling. A set language also skips faster-whisper's language detection pass.
+_TRANSCRIBE_OPTIONS = MappingProxyType({"task": "transcribe", "language": "is", "temperature": 0.0})
+
+# Read-only so callers can share the presets without copying them
+MODES = MappingProxyType({
+    "fast":     MappingProxyType({"beam_size": 1,  "vad_filter": True,  "batch_size": 16,
+                                  "condition_on_previous_text": False, "vad_parameters": _VAD_PARAMETERS}),
+    "balanced": MappingProxyType({"beam_size": 5,  "vad_filter": True,  "batch_size": 8,
+                                  "condition_on_previous_text": False, "vad_parameters": _VAD_PARAMETERS}),
+    "accurate": MappingProxyType({"beam_size": 10, "vad_filter": False, "batch_size": 1,
+                                  "condition_on_previous_text": True}),
+})
 
 # ANSI colors
 DIM = "\033[2m"
@@ -28,138 +131,729 @@ BOLD = "\033[1m"
 RESET = "\033[0m"
 
 
-def transcribe(audio_path, beam_size=5, vad_filter=True, verbose=False):
-    """Transcribe Icelandic audio. Returns dict with full_text, segments, metadata."""
+def _resolve_device(device):
+    """Map "auto" to WHISPER_DEVICE if set, else to CUDA when CTranslate2 can see a GPU."""
+    if device != "auto":
+        return device
+    return os.environ.get("WHISPER_DEVICE") or ("cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu")
+
+
+def _best_compute_type(device):
+    """int8 weights everywhere; on GPU accumulate in FP16, which is both faster and more accurate.
+
+    Arm CPUs with BF16 support (e.g. Graviton3) can also use "int8_bfloat16".
+    """
+    return "int8_float16" if device == "cuda" else "int8"
+
+
+def _warm_model_cache(model_name, download_root=None):
+    """Start reading the downloaded model weights into the page cache (Linux only).
+
+    Readahead overlaps the ~3 GB read with CTranslate2's setup, and the pages
+    stay cached for the next process, such as another --dir worker.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        model_dir = Path(snapshot_download(model_name, cache_dir=download_root, local_files_only=True))
+    except LocalEntryNotFoundError:
+        return  # Not downloaded yet; WhisperModel fetches it and the fresh pages are cached anyway
+    for path in model_dir.glob("*.bin"):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+
+
+@functools.lru_cache(maxsize=2)
+def _get_model(model_name, device, compute_type, cpu_threads, num_workers=1, download_root=None):
+    """Load a WhisperModel once per configuration and keep it for later calls.
+
+    num_workers > 1 lets that many threads call model.transcribe() concurrently;
+    the CPU threads are split between the workers. download_root replaces the
+    Hugging Face cache directory, e.g. with a tmpfs path so loads come from RAM.
+    """
+    _warm_model_cache(model_name, download_root)
+    return WhisperModel(model_name, device=device, compute_type=compute_type,
+                        cpu_threads=max(1, cpu_threads // num_workers), num_workers=num_workers,
+                        download_root=download_root)
+
+
+class _Segment(NamedTuple):
+    start: float
+    end: float
+    text: str
+
+
+class _Info(NamedTuple):
+    duration: float
+    language: str
+    language_probability: float
+
+
+def _backend(requested=None):
+    """Pick the inference engine: whisper.cpp (Metal) on Apple Silicon when configured, else faster-whisper.
+
+    whisper.cpp needs a ggml conversion of MODEL, pointed to by WHISPER_CPP_MODEL,
+    and the pywhispercpp package. Without both we stay on faster-whisper, unless
+    whisper.cpp was requested explicitly, which raises RuntimeError instead.
+    """
+    if requested == "faster-whisper":
+        return requested
+    if requested == "whisper.cpp" or (platform.system() == "Darwin" and platform.machine() == "arm64"):
+        if os.environ.get("WHISPER_CPP_MODEL") and importlib.util.find_spec("pywhispercpp") is not None:
+            return "whisper.cpp"
+        if requested:
+            raise RuntimeError("whisper.cpp needs pywhispercpp and WHISPER_CPP_MODEL pointing at a ggml model")
+    return "faster-whisper"
+
+
+@functools.lru_cache(maxsize=2)
+def _get_cpp_model(model_path, n_threads, beam_search):
+    from pywhispercpp.model import Model
+
+    # whisper.cpp fixes greedy vs beam search when the context is created
+    return Model(model_path, n_threads=n_threads, params_sampling_strategy=1 if beam_search else 0)
+
+
+def _transcribe_cpp(model, audio, beam_size):
+    """Run whisper.cpp and adapt its output to faster-whisper's (segments, info) shape."""
+    segments = model.transcribe(audio, language="is", beam_search={"beam_size": beam_size, "patience": -1.0})
+    # whisper.cpp timestamps are in centiseconds
+    return (
+        (_Segment(seg.t0 / 100, seg.t1 / 100, seg.text) for seg in segments),
+        _Info(duration=len(audio) / SAMPLE_RATE, language="is", language_probability=1.0),
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def _decode(audio_path, mtime_ns):
+    return decode_audio(audio_path, sampling_rate=SAMPLE_RATE)
+
+
+def _load_audio(audio_path):
+    """Decode to 16 kHz mono float32 once; transcribing the same file again reuses the array.
+
+    Keyed by path and mtime so an edited file is decoded afresh. Only the latest
+    file is kept (a 2-hour recording is ~460 MB). Callers must not modify the array.
+    """
+    path = Path(audio_path).resolve()
+    return _decode(str(path), path.stat().st_mtime_ns)
+
+
+def _dumps(obj, pretty=False):
+    """UTF-8 JSON bytes: compact, or indented by two spaces with pretty=True."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else 0)
+    separators = None if pretty else (",", ":")
+    return json.dumps(obj, ensure_ascii=False, indent=2 if pretty else None, separators=separators).encode()
+
+
+def _loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _audio_digest(audio_path):
+    """BLAKE2b of the audio bytes, shared by the transcript and VAD caches."""
+    with open(audio_path, "rb") as f:
+        return hashlib.file_digest(f, "blake2b")
+
+
+def _cache_path(audio_digest, settings, cache_dir=CACHE_DIR):
+    """Cache file for this audio content under these settings."""
+    digest = audio_digest.copy()
+    digest.update(repr(settings).encode())
+    return cache_dir / f"{digest.hexdigest()[:40]}.json"
+
+
+def _write_cache(path, data):
+    """Store data atomically. Best-effort: an unwritable cache only costs a warning, never the result."""
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_bytes(_dumps(data))
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"{RED}Cache write failed:{RESET} {e}", file=sys.stderr)
+
+
+def _speech_timestamps(audio, vad_parameters, cache_file=None):
+    """Silero VAD speech regions as {"start", "end"} sample offsets.
+
+    VAD is a full pass over the waveform; with a cache file the result is
+    reused by every later run on the same audio, whatever the mode.
+    """
+    if cache_file is not None and cache_file.exists():
+        return _loads(cache_file.read_bytes())
+
+    speech = get_speech_timestamps(audio, VadOptions(**vad_parameters))
+    if cache_file is not None:
+        _write_cache(cache_file, speech)
+    return speech
+
+
+def _speech_only(audio, speech):
+    """Drop the silence between speech regions, as faster-whisper's own VAD filter does.
+
+    Returns the speech-only waveform, its windows of at most 30s in seconds (for
+    clip_timestamps), and a SpeechTimestampsMap from its times back to the original.
+    """
+    chunks, windows = collect_chunks(audio, speech, SAMPLE_RATE, max_duration=_CHUNK_S)
+    clips = [{"start": w["offset"], "end": w["offset"] + w["duration"]} for w in windows if w["duration"]]
+    return np.concatenate(chunks), clips, SpeechTimestampsMap(speech, SAMPLE_RATE)
+
+
+class _ClipPool:
+    """Decode VAD clips on parallel threads, each on one of the model's num_workers decoders.
+
+    Same transcribe() shape as BatchedInferencePipeline, for when batching is off.
+    Segments come back in clip order with timestamps shifted to the audio passed in.
+    """
+
+    def __init__(self, model, workers):
+        self.model = model
+        self.workers = workers
+
+    def transcribe(self, audio, clip_timestamps, **options):
+        def decode(clip):
+            start, end = int(clip["start"] * SAMPLE_RATE), int(clip["end"] * SAMPLE_RATE)
+            segments, _ = self.model.transcribe(audio[start:end], vad_filter=False, **options)
+            return [_Segment(seg.start + clip["start"], seg.end + clip["start"], seg.text) for seg in segments]
+
+        def segments():
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for clip_segments in pool.map(decode, clip_timestamps):
+                    yield from clip_segments
+
+        # With the language forced, faster-whisper itself reports a probability of 1
+        return segments(), _Info(duration=len(audio) / SAMPLE_RATE, language="is", language_probability=1.0)
+
+
+def _print_segments(details):
+    # One write for the whole log: stderr is line-buffered, so print() would flush per segment
+    sys.stderr.write("".join(f"  {DIM}{d['start']:.2f}s -> {d['end']:.2f}s{RESET}  {d['text']}\n" for d in details))
+    sys.stderr.flush()
+
+
+def transcribe_stream(audio_path, beam_size=5, vad_filter=True, batch_size=8, cache=False, device="auto",
+                      cpu_threads=None, condition_on_previous_text=False, compute_type=None, num_workers=1,
+                      download_root=None, vad_parameters=_VAD_PARAMETERS, backend=None):
+    """Transcribe Icelandic audio, yielding each kept segment dict as soon as it is decoded.
+
+    The generator's return value (StopIteration.value) is the metadata dict;
+    transcribe() collects both into the full result.
+
+    device is "cpu", "cuda" or "auto" (WHISPER_DEVICE, else CUDA when a GPU is visible).
+    compute_type defaults to int8 weights with FP16 compute on CUDA and plain int8 on CPU.
+    num_workers sizes the model's pool of concurrent decoders (see _get_model). With
+    batching off and VAD on, num_workers > 1 decodes the speech clips on that many threads.
+
+    With cache=True the result is stored under .cache/transcripts/, keyed by the
+    audio content and decode settings, and re-runs on the same audio replay it directly.
+
+    With batch_size > 1 the speech VAD finds is packed, without the silence in
+    between, into windows of up to 30s that are decoded in batches through
+    BatchedInferencePipeline. Batching needs VAD to split the audio, so it is
+    only used when vad_filter is on. With cache=True the VAD result is cached
+    too, so a second mode on the same audio skips straight to decoding.
+    vad_parameters are faster-whisper VadOptions fields; keep max_speech_duration_s
+    at 30 or below, since a batched clip is cut off after 30s.
+
+    condition_on_previous_text feeds each window's text into the next one as a
+    prompt. It helps consistency on long unsegmented audio but serialises the
+    decoder, so it is off unless asked for; the batched pipeline never uses it.
+
+    backend is "faster-whisper" or "whisper.cpp"; None picks one (see _backend).
+    whisper.cpp decodes the whole file itself and uses only beam_size.
+    """
+    backend = _backend(backend)
+    device = _resolve_device(device)
+    compute_type = compute_type or _best_compute_type(device)
+    cpu_threads = cpu_threads or _worker_threads()
+
+    # whisper.cpp runs whichever ggml conversion WHISPER_CPP_MODEL names, so that path identifies the model
+    model_name = os.environ["WHISPER_CPP_MODEL"] if backend == "whisper.cpp" else MODEL
+
+    audio_digest = _audio_digest(audio_path) if cache else None
+    vad_settings = tuple(sorted(vad_parameters.items())) if vad_filter else None
+    settings = (model_name, backend, device, compute_type, beam_size, vad_filter, vad_settings, batch_size,
+                condition_on_previous_text, num_workers > 1)
+    cache_file = _cache_path(audio_digest, settings) if cache else None
+    if cache_file is not None and cache_file.exists():
+        cached = _loads(cache_file.read_bytes())
+        print(f"{DIM}Using cached transcript{RESET}", file=sys.stderr)
+        yield from cached["segments"]
+        return {**cached["metadata"], "audio_file": str(Path(audio_path).resolve())}
+
     print(f"{DIM}Loading model...{RESET}", end="", file=sys.stderr, flush=True)
-    t0 = time.time()
-    model = WhisperModel(MODEL, device="cpu", compute_type="int8", cpu_threads=os.cpu_count())
-    model_load_time = time.time() - t0
+    t0 = time.perf_counter()
+    if backend == "whisper.cpp":
+        model = _get_cpp_model(model_name, cpu_threads, beam_size > 1)
+    else:
+        model = _get_model(model_name, device, compute_type, cpu_threads, num_workers, download_root)
+    model_load_time = time.perf_counter() - t0
     print(f" {model_load_time:.1f}s", file=sys.stderr)
 
     print(f"{DIM}Transcribing...{RESET}", end="", file=sys.stderr, flush=True)
-    t0 = time.time()
-
-    segments, info = model.transcribe(
-        audio_path,
-        beam_size=beam_size,
-        language="is",
-        temperature=0.0,
-        vad_filter=vad_filter,
-        vad_parameters=dict(min_silence_duration_ms=500) if vad_filter else None,
-    )
+    t0 = time.perf_counter()
 
-    texts = []
-    details = []
+    # Decode once up front; faster-whisper would otherwise run ffmpeg itself inside transcribe()
+    audio = _load_audio(audio_path)
 
+    if backend == "whisper.cpp":
+        segments, info = _transcribe_cpp(model, audio, beam_size)
+    else:
+        # Timestamps are cached in samples, so the sample rate is part of the key
+        vad_cache = _cache_path(audio_digest, (SAMPLE_RATE, vad_settings), VAD_CACHE_DIR) if cache and vad_filter else None
+        speech = None
+        if vad_filter and (batch_size > 1 or num_workers > 1):
+            speech = _speech_timestamps(audio, vad_parameters, vad_cache)
+
+        if speech is None:
+            segments, info = model.transcribe(
+                audio, beam_size=beam_size, **_TRANSCRIBE_OPTIONS, vad_filter=vad_filter,
+                vad_parameters=dict(vad_parameters) if vad_filter else None,
+                condition_on_previous_text=condition_on_previous_text,
+            )
+        elif not speech:
+            # No speech; the batched pipeline would take empty clip_timestamps as a cue to rerun VAD its own way
+            segments, info = iter(()), _Info(duration=len(audio) / SAMPLE_RATE, language="is", language_probability=1.0)
+        else:
+            speech_audio, clips, ts_map = _speech_only(audio, speech)
+            if batch_size > 1:
+                engine = BatchedInferencePipeline(model=model)
+                engine_args = {"batch_size": batch_size}
+            else:
+                engine = _ClipPool(model, num_workers)
+                engine_args = {"condition_on_previous_text": condition_on_previous_text}
+            segments, info = engine.transcribe(speech_audio, beam_size=beam_size, clip_timestamps=clips,
+                                               **_TRANSCRIBE_OPTIONS, **engine_args)
+            segments = (_Segment(ts_map.get_original_time(seg.start), ts_map.get_original_time(seg.end, is_end=True),
+                                 seg.text) for seg in segments)
+            # The engine only saw the speech, so its duration is the speech's
+            info = _Info(duration=len(audio) / SAMPLE_RATE, language=info.language,
+                         language_probability=info.language_probability)
+
+    # Only the cache needs the whole transcript; otherwise nothing is kept once yielded
+    details = [] if cache_file is not None else None
     for seg in segments:
         text = seg.text.strip()
         # Skip hallucinated micro-segments
-        if (seg.end - seg.start) < 0.3 and len(text) <= 3:
+        if seg.end - seg.start < _MIN_DUR and len(text) <= _MIN_LEN:
             continue
-        if verbose:
-            print(f"  {DIM}{seg.start:.2f}s -> {seg.end:.2f}s{RESET}  {text}", file=sys.stderr)
-        texts.append(text)
-        details.append({"start": seg.start, "end": seg.end, "text": text})
+        d = {"start": seg.start, "end": seg.end, "text": text}
+        if details is not None:
+            details.append(d)
+        yield d
 
-    transcription_time = time.time() - t0
+    transcription_time = time.perf_counter() - t0
     print(f" {transcription_time:.1f}s", file=sys.stderr)
 
-    return {
-        "full_text": " ".join(texts),
-        "segments": details,
-        "metadata": {
-            "audio_duration": info.duration,
-            "language": info.language,
-            "language_probability": info.language_probability,
-            "model_load_time": model_load_time,
-            "transcription_time": transcription_time,
-            "audio_file": str(Path(audio_path).resolve()),
-        },
+    metadata = {
+        "audio_duration": info.duration or len(audio) / SAMPLE_RATE,
+        "language": info.language,
+        "language_probability": info.language_probability,
+        "model_load_time": model_load_time,
+        "transcription_time": transcription_time,
+        "audio_file": str(Path(audio_path).resolve()),
     }
+    if cache_file is not None:
+        _write_cache(cache_file, {"full_text": " ".join(d["text"] for d in details), "segments": details,
+                                  "metadata": metadata})
+    return metadata
+
+
+def transcribe(audio_path, verbose=False, on_segment=None, **options):
+    """Transcribe Icelandic audio. Returns dict with full_text, segments, metadata.
+
+    on_segment, if given, is called with each kept segment dict as soon as it is decoded.
+    Other options are those of transcribe_stream().
+    """
+    stream = transcribe_stream(audio_path, **options)
+    details = []
+    while True:
+        try:
+            d = next(stream)
+        except StopIteration as done:
+            metadata = done.value
+            break
+        details.append(d)
+        if on_segment is not None:
+            on_segment(d)
+
+    if verbose:
+        _print_segments(details)
+
+    return {"full_text": " ".join(d["text"] for d in details), "segments": details, "metadata": metadata}
+
+
+def _preload_model(backend, device, compute_type, *model_args):
+    """Worker initializer: load this process's model before its first file arrives.
+
+    The device is resolved here rather than in the parent, since probing for a GPU
+    initialises CUDA and a forked child cannot use CUDA set up before the fork.
+    """
+    if _backend(backend) == "faster-whisper":
+        device = _resolve_device(device)
+        _get_model(MODEL, device, compute_type or _best_compute_type(device), *model_args)
+
+
+def _transcribe_quietly(audio_path, **options):
+    # Progress lines from parallel workers would interleave, so each worker's stderr is dropped
+    with redirect_stderr(io.StringIO()):
+        return transcribe(audio_path, **options)
+
+
+def _transcribe_or_error(audio_path, **options):
+    try:
+        return transcribe(audio_path, **options)
+    except Exception as e:
+        return e
+
+
+def transcribe_batch(audio_paths, workers=2, **options):
+    """Transcribe several files in parallel worker processes. Returns results in input order.
+
+    A file that fails gets its exception in place of a result, so one bad file
+    doesn't lose the rest. Each worker loads its own copy of the model, so workers
+    are capped to leave every one at least two CPU threads. Options are passed on
+    to transcribe().
+    """
+    workers = max(1, min(workers, len(audio_paths), _worker_threads() // 2))
+    if workers == 1:
+        return [_transcribe_or_error(path, **options) for path in audio_paths]
+
+    options["cpu_threads"] = _worker_threads() // workers
+    if options.get("vad_parameters") is not None:
+        # The presets' read-only mappings can't be pickled over to the workers
+        options["vad_parameters"] = dict(options["vad_parameters"])
+    initargs = (options.get("backend"), options.get("device", "auto"), options.get("compute_type"),
+                options["cpu_threads"], options.get("num_workers", 1), options.get("download_root"))
+    # Workers' stderr is dropped, so the segment log is printed here as each file comes back
+    verbose = options.pop("verbose", False)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_preload_model, initargs=initargs) as pool:
+        futures = [pool.submit(_transcribe_quietly, path, **options) for path in audio_paths]
+        for future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                result = e
+            else:
+                if verbose:
+                    _print_segments(result["segments"])
+            results.append(result)
+    return results
+
+
+# Transcript files are written in the background; flush() (also run at exit) waits for them.
+# One writer keeps the disk access sequential and the files landing in the order they were saved.
+_io_pool = ThreadPoolExecutor(max_workers=1)
+_pending = []  # (path, future) pairs
+
+
+def _write_async(path, data):
+    # Drop finished writes so a long run doesn't pile up futures; failed ones stay for flush() to report
+    _pending[:] = [(p, f) for p, f in _pending if not f.done() or f.exception() is not None]
+    _pending.append((path, _io_pool.submit(path.write_bytes, data)))
+
+
+def flush():
+    """Block until all queued transcript writes are on disk.
+
+    Raises OSError naming every file that could not be written.
+    """
+    errors = []
+    while _pending:
+        path, future = _pending.pop(0)
+        try:
+            future.result()
+        except OSError as e:
+            errors.append(f"{path}: {e.strerror or e}")
+    if errors:
+        raise OSError(f"Could not write {'; '.join(errors)}")
 
 
-def save_result(result, audio_path, corrected_text=None):
-    """Save transcript files to transcripts/ directory."""
-    out = Path("transcripts")
-    out.mkdir(exist_ok=True)
-    stem = Path(audio_path).stem
+atexit.register(flush)
 
-    (out / f"{stem}_transcript.txt").write_text(result["full_text"], encoding="utf-8")
-    with open(out / f"{stem}_transcript.json", "w", encoding="utf-8") as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
 
-    print(f"{GREEN}Saved:{RESET} transcripts/{stem}_transcript.txt", file=sys.stderr)
-    print(f"{GREEN}Saved:{RESET} transcripts/{stem}_transcript.json", file=sys.stderr)
+def _output_paths(audio_path):
+    """Create transcripts/ and return a function mapping a suffix to transcripts/<stem>_<suffix>."""
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    prefix = f"{Path(audio_path).stem}_"
+    return lambda suffix: OUTPUT_DIR / (prefix + suffix)
 
+
+@contextmanager
+def stream_segments(audio_path):
+    """Write segments to transcripts/ as they are decoded. Yields a callback for transcribe(on_segment=...).
+
+    The plain text goes to <stem>_transcript.txt and one JSON object per segment
+    to <stem>_segments.jsonl, so output appears while a long file is still decoding.
+    """
+    path = _output_paths(audio_path)
+    txt_path, jsonl_path = path("transcript.txt"), path("segments.jsonl")
+
+    with open(txt_path, "w", encoding="utf-8") as txt, open(jsonl_path, "wb") as jsonl:
+        sep = ""
+
+        def write(segment):
+            nonlocal sep
+            txt.write(sep + segment["text"])
+            txt.flush()
+            jsonl.write(_dumps(segment) + b"\n")
+            jsonl.flush()
+            sep = " "
+
+        yield write
+
+    print(f"{GREEN}Saved:{RESET} {txt_path}", file=sys.stderr)
+    print(f"{GREEN}Saved:{RESET} {jsonl_path}", file=sys.stderr)
+
+
+def _save(path, data):
+    _write_async(path, data)
+    print(f"{GREEN}Saved:{RESET} {path}", file=sys.stderr)
+
+
+def save_result(result, audio_path, corrected_text=None, include_text=True, pretty=False):
+    """Queue transcript files for writing to the transcripts/ directory. Call flush() to wait for them.
+
+    The full result is stored as compact gzipped JSON (<stem>_transcript.json.gz);
+    pretty=True writes indented plain <stem>_transcript.json instead.
+    include_text also writes <stem>_transcript.txt and <stem>_segments.jsonl; pass
+    include_text=False when stream_segments() already wrote them.
+    """
+    path = _output_paths(audio_path)
+
+    if include_text:
+        _save(path("transcript.txt"), result["full_text"].encode("utf-8"))
+        _save(path("segments.jsonl"), b"".join(_dumps(seg) + b"\n" for seg in result["segments"]))
+    if pretty:
+        _save(path("transcript.json"), _dumps(result, pretty=True))
+    else:
+        _save(path("transcript.json.gz"), gzip.compress(_dumps(result), compresslevel=3))
     if corrected_text is not None:
-        (out / f"{stem}_corrected.txt").write_text(corrected_text, encoding="utf-8")
-        print(f"{GREEN}Saved:{RESET} transcripts/{stem}_corrected.txt", file=sys.stderr)
+        _save(path("corrected.txt"), corrected_text.encode("utf-8"))
+
+
+def _correct_result(result, verbose):
+    """Fix a transcript with Gemini, segment by segment, timing it on stderr."""
+    from correction import correct_segments
+
+    print(f"{DIM}Correcting with Gemini...{RESET}", end="", file=sys.stderr, flush=True)
+    t0 = time.perf_counter()
+    corrected_text = correct_segments([s["text"] for s in result["segments"]], verbose=verbose)
+    print(f" {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+    return corrected_text
+
+
+def _batch_line(status, audio_path, text):
+    """One --batch reply line. Tabs and line breaks inside a field would break the protocol, so they become spaces."""
+    fields = (status, audio_path, str(text))
+    return "\t".join(" ".join(f.replace("\t", " ").splitlines()) for f in fields)
+
+
+def _usage_error(message):
+    print(f"{RED}Error:{RESET} {message}", file=sys.stderr)
+    print(f"Run 'python transcribe.py --help' for usage.", file=sys.stderr)
+    sys.exit(1)
 
 
 if __name__ == "__main__":
     if len(sys.argv) < 2 or sys.argv[1] in ("-h", "--help"):
         print(f"{BOLD}Usage:{RESET} python transcribe.py <audio_file> [mode] [options]")
+        print(f"       python transcribe.py --dir <directory> [mode] [options]")
+        print(f"       python transcribe.py --glob '<pattern>' [mode] [options]")
+        print(f"       python transcribe.py --batch [mode] [options] < paths.txt")
         print()
         print(f"{BOLD}Modes:{RESET}")
-        print(f"  fast       {DIM}beam_size=1, fastest{RESET}")
-        print(f"  balanced   {DIM}beam_size=5, default{RESET}")
-        print(f"  accurate   {DIM}beam_size=10, best quality{RESET}")
+        print(f"  fast       {DIM}beam_size=1 (greedy), fastest, default with --llm{RESET}")
+        print(f"  balanced   {DIM}beam_size=5, default without --llm{RESET}")
+        print(f"  accurate   {DIM}beam_size=10, best quality but slowest{RESET}")
+        print(f"             {DIM}Only accurate prompts each 30s window with the previous one's text: more{RESET}")
+        print(f"             {DIM}consistent on long audio, but windows must decode one after another{RESET}")
         print()
         print(f"{BOLD}Options:{RESET}")
-        print(f"  --llm, -l      {DIM}Fix punctuation/grammar with Google Gemini{RESET}")
-        print(f"  --save, -s     {DIM}Save output to transcripts/ directory{RESET}")
-        print(f"  --verbose, -v  {DIM}Show timestamps, timing, and progress{RESET}")
+        print(f"  --llm, -l              {DIM}Fix punctuation/grammar with Google Gemini{RESET}")
+        print(f"  --save, -s             {DIM}Save output to transcripts/ directory{RESET}")
+        print(f"  --verbose, -v          {DIM}Show timestamps, timing, and progress{RESET}")
+        print(f"  --pretty               {DIM}With --save, write indented .json instead of .json.gz{RESET}")
+        print(f"  --no-cache             {DIM}Re-transcribe even if this audio was transcribed before{RESET}")
+        print(f"  --dir DIR              {DIM}Transcribe every audio file in DIR{RESET}")
+        print(f"  --glob PATTERN         {DIM}Transcribe every file matching PATTERN (quote it; ** recurses){RESET}")
+        print(f"  --device D             {DIM}auto (default: WHISPER_DEVICE, else GPU if visible), cpu, cuda{RESET}")
+        print(f"  --compute-type T       {DIM}e.g. float16 (default int8; int8_float16 on GPU){RESET}")
+        print(f"  --model-cache-dir DIR  {DIM}Keep the model in DIR, e.g. /dev/shm/whisper to load from RAM{RESET}")
+        print(f"  --backend B            {DIM}faster-whisper or whisper.cpp (ggml model in WHISPER_CPP_MODEL){RESET}")
+        print(f"  --pin-threads          {DIM}Run on one logical CPU per physical core (Linux){RESET}")
+        print(f"  --workers N            {DIM}With --dir/--glob, transcribe N files in parallel (default 2){RESET}")
+        print(f"  --clip-threads N       {DIM}fast/balanced: decode N speech clips at once on separate threads{RESET}")
+        print(f"                         {DIM}instead of batching them{RESET}")
+        print(f"  --batch                {DIM}Read audio paths from stdin, one per line; loads the model once{RESET}")
+        print(f"                         {DIM}and answers OK<tab>path<tab>text or ERR<tab>path<tab>error{RESET}")
         print()
         print(f"{BOLD}Examples:{RESET}")
         print(f"  python transcribe.py audio/sample.m4a")
         print(f"  python transcribe.py audio/sample.m4a fast --llm")
         print(f"  python transcribe.py audio/sample.m4a --llm --save -v")
+        print(f"  python transcribe.py --dir audio/ --workers 4 --save")
         sys.exit(0)
 
-    audio_path = sys.argv[1]
-    if not Path(audio_path).exists():
-        print(f"{RED}Error:{RESET} File not found: {audio_path}", file=sys.stderr)
-        sys.exit(1)
-
-    # Parse mode (optional positional arg, must come right after audio file)
-    mode = "balanced"
-    flags_start = 2
-    if len(sys.argv) > 2 and not sys.argv[2].startswith("-"):
-        if sys.argv[2] in MODES:
-            mode = sys.argv[2]
-            flags_start = 3
-        else:
-            print(f"{RED}Error:{RESET} Invalid mode '{sys.argv[2]}'. Must be one of: fast, balanced, accurate", file=sys.stderr)
-            print(f"Run 'python transcribe.py --help' for usage.", file=sys.stderr)
+    args = sys.argv[1:]
+    batch_mode = args[0] in ("--dir", "--glob")
+    stdin_mode = args[0] == "--batch"
+    if stdin_mode:
+        audio_paths = None
+        args = args[1:]
+    elif args[0] == "--dir":
+        if len(args) < 2 or not Path(args[1]).is_dir():
+            print(f"{RED}Error:{RESET} Directory not found: {args[1] if len(args) > 1 else ''}", file=sys.stderr)
+            sys.exit(1)
+        audio_paths = sorted(str(p) for p in Path(args[1]).iterdir() if p.suffix.lower() in AUDIO_EXTENSIONS)
+        if not audio_paths:
+            print(f"{RED}Error:{RESET} No audio files found in {args[1]}", file=sys.stderr)
             sys.exit(1)
+        args = args[2:]
+    elif args[0] == "--glob":
+        if len(args) < 2:
+            _usage_error("--glob needs a pattern, e.g. 'audio/*.m4a'")
+        audio_paths = sorted(p for p in glob.glob(args[1], recursive=True) if Path(p).is_file())
+        if not audio_paths:
+            print(f"{RED}Error:{RESET} No files match {args[1]}", file=sys.stderr)
+            sys.exit(1)
+        args = args[2:]
+    else:
+        if not Path(args[0]).exists():
+            print(f"{RED}Error:{RESET} File not found: {args[0]}", file=sys.stderr)
+            sys.exit(1)
+        audio_paths = [args[0]]
+        args = args[1:]
+
+    # Parse mode (optional positional arg, must come right after the audio file or directory)
+    mode = None
+    if args and not args[0].startswith("-"):
+        if args[0] not in MODES:
+            _usage_error(f"Invalid mode '{args[0]}'. Must be one of: fast, balanced, accurate")
+        mode = args.pop(0)
 
     # Parse flags
-    known_flags = {"--llm", "-l", "--save", "-s", "--verbose", "-v"}
-    flags = sys.argv[flags_start:]
-    for flag in flags:
-        if flag not in known_flags:
-            print(f"{RED}Error:{RESET} Unknown argument '{flag}'", file=sys.stderr)
-            print(f"Run 'python transcribe.py --help' for usage.", file=sys.stderr)
-            sys.exit(1)
+    known_flags = {"--llm", "-l", "--save", "-s", "--verbose", "-v", "--pretty", "--no-cache", "--pin-threads"}
+    flags = []
+    workers = 2
+    clip_threads = 1
+    device = "auto"
+    compute_type = None
+    download_root = None
+    backend = None
+    while args:
+        flag = args.pop(0)
+        if flag == "--workers":
+            if not args or not args[0].isdigit() or int(args[0]) < 1:
+                _usage_error("--workers needs a positive number")
+            workers = int(args.pop(0))
+        elif flag == "--clip-threads":
+            if not args or not args[0].isdigit() or int(args[0]) < 1:
+                _usage_error("--clip-threads needs a positive number")
+            clip_threads = int(args.pop(0))
+        elif flag == "--device":
+            if not args or args[0] not in ("auto", "cpu", "cuda"):
+                _usage_error("--device must be one of: auto, cpu, cuda")
+            device = args.pop(0)
+        elif flag == "--compute-type":
+            if not args or args[0] not in COMPUTE_TYPES:
+                _usage_error(f"--compute-type must be one of: {', '.join(COMPUTE_TYPES)}")
+            compute_type = args.pop(0)
+        elif flag == "--backend":
+            if not args or args[0] not in ("faster-whisper", "whisper.cpp"):
+                _usage_error("--backend must be one of: faster-whisper, whisper.cpp")
+            backend = args.pop(0)
+            try:
+                _backend(backend)
+            except RuntimeError as e:
+                _usage_error(str(e))
+        elif flag == "--model-cache-dir":
+            if not args:
+                _usage_error("--model-cache-dir needs a directory")
+            download_root = args.pop(0)
+        elif flag in known_flags:
+            flags.append(flag)
+        else:
+            _usage_error(f"Unknown argument '{flag}'")
 
     use_llm = "--llm" in flags or "-l" in flags
     save = "--save" in flags or "-s" in flags
     verbose = "--verbose" in flags or "-v" in flags
+    pretty = "--pretty" in flags
+    cache = "--no-cache" not in flags
+    if "--pin-threads" in flags:
+        _pin_threads()
+
+    # Beam search buys little once Gemini fixes the text, so --llm defaults to greedy decoding
+    if mode is None:
+        mode = "fast" if use_llm else "balanced"
+    options = dict(verbose=verbose, cache=cache, device=device, compute_type=compute_type, download_root=download_root,
+                   backend=backend, **MODES[mode])
+    if clip_threads > 1:
+        if not options["vad_filter"]:
+            _usage_error(f"--clip-threads needs a mode that splits the audio with VAD (fast or balanced), not {mode}")
+        # The clip pool replaces the batched pipeline, so batching goes off
+        options.update(batch_size=1, num_workers=clip_threads)
 
-    result = transcribe(audio_path=audio_path, verbose=verbose, **MODES[mode])
-    text = result["full_text"]
+    if stdin_mode:
+        # Long-running pipelines feed paths here so the model loads once for the whole run.
+        # Anything after a tab on the input line is ignored.
+        for line in sys.stdin:
+            audio_path = line.rstrip("\n").split("\t")[0]
+            if not audio_path:
+                continue
+            try:
+                result = transcribe(audio_path, **options)
+                corrected_text = _correct_result(result, verbose) if use_llm else None
+                if save:
+                    save_result(result, audio_path, corrected_text, pretty=pretty)
+                    # Wait for this file's writes so its reply covers them
+                    flush()
+            except Exception as e:
+                print(_batch_line("ERR", audio_path, e), flush=True)
+                continue
+            print(_batch_line("OK", audio_path, corrected_text or result["full_text"]), flush=True)
+        sys.exit(0)
 
-    corrected_text = None
-    if use_llm:
-        from correction import correct_icelandic
+    if batch_mode:
+        results = transcribe_batch(audio_paths, workers=workers, **options)
+    elif save:
+        with stream_segments(audio_paths[0]) as write_segment:
+            results = [transcribe(audio_paths[0], on_segment=write_segment, **options)]
+    else:
+        results = [transcribe(audio_paths[0], **options)]
+
+    failed = 0
+    for audio_path, result in zip(audio_paths, results):
+        if isinstance(result, Exception):
+            print(f"{RED}Error:{RESET} {audio_path}: {result}", file=sys.stderr)
+            failed += 1
+            continue
+        text = result["full_text"]
 
-        print(f"{DIM}Correcting with Gemini...{RESET}", end="", file=sys.stderr, flush=True)
-        t0 = time.time()
-        corrected_text = correct_icelandic(text, verbose=verbose)
-        print(f" {time.time() - t0:.1f}s", file=sys.stderr)
-        text = corrected_text
+        corrected_text = None
+        if use_llm:
+            corrected_text = text = _correct_result(result, verbose)
 
-    print(text)
+        if batch_mode:
+            print(f"{BOLD}{Path(audio_path).name}{RESET}")
+        print(text)
 
-    if save:
-        save_result(result, audio_path, corrected_text)
+        if save:
+            save_result(result, audio_path, corrected_text, include_text=batch_mode, pretty=pretty)
+
+    try:
+        flush()
+    except OSError as e:
+        print(f"{RED}Error:{RESET} {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if failed:
+        print(f"{RED}Error:{RESET} {failed} of {len(audio_paths)} files failed", file=sys.stderr)
+        sys.exit(1)